@@ -1,17 +1,48 @@
 #!/usr/bin/env python
 
-import re
-
 from board import Board, KingInCheck, InvalidMove
-from serialization import to_bit
+from constants import *
+from serialization import san
+
+
+# square names and promotion letters, in either case
+SQUARES = dict((name, sq) for sq in xrange(64)
+	for name in (san(sq), san(sq).upper()))
+PROMOTIONS = {"n": WHITE_KNIGHT, "b": WHITE_BISHOP, "r": WHITE_ROOK,
+	"q": WHITE_QUEEN}
+PROMOTIONS.update((k.upper(), v) for k, v in PROMOTIONS.items())
+
 
+class IllegalMove(InvalidMove):
+	""" A move passed to `Chess.play` could not be parsed or made """
 
-LAN_PATT = r"([a-g]{1}[1-8]{1})-([a-g]{1}[1-8]{1})([nbrq]{1})?"
+	def __init__(self, index, move, reason):
+		InvalidMove.__init__(self, "move %i (%s): %s" % (index, move, reason))
+		self.index = index    # position of the move in the sequence
+		self.move = move
+		self.reason = reason  # the InvalidMove / KingInCheck raised
+
+
+def parse_move(text):
+	""" (frm, to, promotion letter or None) of a move in LAN (e2-e4,
+		e7-e8q) or UCI (e2e4, e7e8q) form
+	"""
+	try:
+		frm = SQUARES[text[:2]]
+		i = 3 if text[2] in "-x" else 2
+		to = SQUARES[text[i:i+2]]
+		promotion = text[i+2:].lstrip("=") or None
+		if promotion and promotion not in PROMOTIONS:
+			raise KeyError(promotion)
+	except (KeyError, IndexError):
+		raise InvalidMove("Cannot parse move %r" % text)
+	return frm, to, promotion
 
 
 class Chess(object):
 
-	board = Board()
+	def __init__(self, fen=INITIAL_FEN):
+		self.board = Board(fen)
 
 	def __unicode__(self):
 		return self.board.__unicode__()
@@ -27,13 +58,57 @@ class Chess(object):
 
 	def makemove(self, lan):
 		""" :param lan: (LAN) form of move e.g.: a2a3 """
-		frm, to, promotion = re.match(LAN_PATT, lan.lower()).groups()
 		try:
-			self.board.makemove(to_bit(frm), to_bit(to), promotion=promotion)
+			frm, to, promotion = parse_move(lan)
+			if promotion:
+				promotion = PROMOTIONS[promotion] | self.board.player << 3
+			self.board.makemove(frm, to, promotion=promotion)
 		except (KingInCheck, InvalidMove) as e:
 			return e
 		else:
 			return "OK"
 
+	def play(self, moves):
+		""" Make a sequence of moves in LAN or UCI form
+
+			:param moves: list of moves, or a string of them separated by spaces
+			:returns: the number of moves made
+			:raises IllegalMove: for the first move that cannot be made, once
+				the moves before it have been made
+		"""
+		if isinstance(moves, basestring):
+			moves = moves.split()
+
+		board = self.board
+		makemove = board.makemove
+		start = len(board.moves)
+		for i, text in enumerate(moves):
+			try:
+				frm, to, promotion = parse_move(text)
+				if promotion:
+					promotion = PROMOTIONS[promotion] | board.player << 3
+				makemove(frm, to, promotion)
+			except (KingInCheck, InvalidMove) as e:
+				raise IllegalMove(i, text, e)
+		return len(board.moves) - start
+
 	def side_to_move(self):
 		return ["W", "B"][self.board.player]
+
+	def in_check(self):
+		return self.board.in_check()
+
+	def has_legal_move(self):
+		return self.board.has_legal_move()
+
+	def is_checkmate(self):
+		return self.board.is_checkmate()
+
+	def is_stalemate(self):
+		return self.board.is_stalemate()
+
+	def is_repetition(self, n=3):
+		return self.board.is_repetition(n)
+
+	def is_fifty_move_draw(self):
+		return self.board.is_fifty_move_draw()
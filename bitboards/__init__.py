@@ -20,9 +20,34 @@
         bin 10000000010001000010100000000000001010000100010010000001000000
 """
 
+import time
+_start = time.time()
 
 from .masks import *
 from .pieces  import *
 from .pawns import *
 from .debug import *
 from twiddling import *
+from . import kernels, pieces, tables
+
+
+def use_sliders(name):
+    """ Select the slider attack backend: "magic" (default) or "rotated" """
+    pieces.use_sliders(name)
+    globals().update(R_attacks=pieces.R_attacks, B_attacks=pieces.B_attacks,
+                     attacks=pieces.attacks)
+
+
+def use_kernel(name):
+    """ Select the bit twiddling kernel: "parallel", "bit_length" or
+        "table" (default: the fastest on this interpreter)
+    """
+    globals().update(kernels.KERNELS[name])
+
+
+KERNEL = tables.cached("kernel", kernels.fastest,
+                       "-".join(sorted(kernels.KERNELS)))
+use_kernel(KERNEL)
+
+
+LOAD_TIME = time.time() - _start  # seconds spent importing `bitboards`
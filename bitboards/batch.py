@@ -0,0 +1,214 @@
+""" Attacks and move counts for many positions at once, using NumPy
+
+    Positions are an (N, 17) uint64 array whose rows are `Board.positions`
+    (see `from_boards`). Attacked-square maps are built with set-wise
+    shifts and occluded fills over whole columns; per-piece attack sets
+    are gathered from the lookup and magic tables for all 64 squares at
+    once, so intermediate arrays are (N, 64): split very large batches
+    into chunks.
+
+    The 17 bitboards do not record castling rights or the en passant
+    square, so `move_counts` counts pseudo-legal moves without those.
+"""
+
+import numpy as np
+
+from .masks import FULL, FILE_MASK, RANK_MASK
+from .lookups import K_ATTACKS, N_ATTACKS, P_ATTACKS
+from . import magics
+
+
+U64 = np.uint64
+
+OFFSET = 14
+PAWN, KING, KNIGHT, BISHOP, ROOK, QUEEN = range(6)
+
+NOT_A = U64(FULL ^ FILE_MASK[0])
+NOT_AB = U64(FULL ^ FILE_MASK[0] ^ FILE_MASK[1])
+NOT_H = U64(FULL ^ FILE_MASK[7])
+NOT_GH = U64(FULL ^ FILE_MASK[7] ^ FILE_MASK[6])
+ALL = U64(FULL)
+RANK_3 = U64(RANK_MASK[2])
+RANK_6 = U64(RANK_MASK[5])
+PROMOTION_RANK = (U64(RANK_MASK[7]), U64(RANK_MASK[0]))
+
+SQUARES = np.arange(64, dtype=np.uint64)
+
+
+def _table(values):
+    return np.array(values, dtype=np.uint64)
+
+
+K_TABLE = _table(K_ATTACKS[:64])
+N_TABLE = _table(N_ATTACKS[:64])
+P_TABLE = (_table(P_ATTACKS[0][:64]), _table(P_ATTACKS[1][:64]))
+
+
+def _magic_tables(masks, magics_, shifts, tables):
+    """ Flatten one slider's per-square tables into a single array """
+    offsets = np.cumsum([0] + [len(t) for t in tables[:-1]])
+    flat = _table([a for t in tables for a in t])
+    return _table(masks), _table(magics_), _table(shifts), offsets, flat
+
+
+R_MAGIC = _magic_tables(magics.R_MASKS, magics.ROOK_MAGICS, magics.R_SHIFTS,
+                        magics.R_TABLES)
+B_MAGIC = _magic_tables(magics.B_MASKS, magics.BISHOP_MAGICS,
+                        magics.B_SHIFTS, magics.B_TABLES)
+
+
+def from_boards(boards):
+    """ (N, 17) uint64 array of the bitboards of each board """
+    return np.array([list(b.positions) for b in boards], dtype=np.uint64)
+
+
+def popcount(x):
+    """ Number of set bits in each element of a uint64 array """
+    x = x - ((x >> U64(1)) & U64(0x5555555555555555))
+    x = (x & U64(0x3333333333333333)) + ((x >> U64(2)) & U64(0x3333333333333333))
+    x = (x + (x >> U64(4))) & U64(0x0F0F0F0F0F0F0F0F)
+    return ((x * U64(0x0101010101010101)) >> U64(56)).astype(np.int64)
+
+
+### Set-wise shifts ###
+
+def _north(b, n=1):
+    return b << U64(8 * n)
+
+
+def _south(b, n=1):
+    return b >> U64(8 * n)
+
+
+def pawn_attacks(pawns, side):
+    """ Squares attacked by a set of pawns """
+    if side == 0:
+        return ((pawns << U64(7)) & NOT_H) | ((pawns << U64(9)) & NOT_A)
+    return ((pawns >> U64(9)) & NOT_H) | ((pawns >> U64(7)) & NOT_A)
+
+
+def knight_attacks(knights):
+    one = ((knights << U64(17)) | (knights >> U64(15))) & NOT_A | \
+        ((knights << U64(15)) | (knights >> U64(17))) & NOT_H
+    two = ((knights << U64(10)) | (knights >> U64(6))) & NOT_AB | \
+        ((knights << U64(6)) | (knights >> U64(10))) & NOT_GH
+    return one | two
+
+
+def king_attacks(kings):
+    row = kings | ((kings << U64(1)) & NOT_A) | ((kings >> U64(1)) & NOT_H)
+    return (row | _north(row) | _south(row)) ^ kings
+
+
+# (shift, wrap mask) for each ray direction: positive shifts go left
+_ROOK_RAYS = ((8, ALL), (-8, ALL), (1, NOT_A), (-1, NOT_H))
+_BISHOP_RAYS = ((9, NOT_A), (7, NOT_H), (-7, NOT_A), (-9, NOT_H))
+
+
+def _shift(b, n):
+    if n > 0:
+        return b << U64(n)
+    return b >> U64(-n)
+
+
+def _fill(sliders, empty, n, mask):
+    """ Kogge-Stone occluded fill: squares attacked along one ray """
+    empty = empty & mask
+    sliders = sliders | (empty & _shift(sliders, n))
+    empty = empty & _shift(empty, n)
+    sliders = sliders | (empty & _shift(sliders, 2*n))
+    empty = empty & _shift(empty, 2*n)
+    sliders = sliders | (empty & _shift(sliders, 4*n))
+    return _shift(sliders, n) & mask
+
+
+def slider_attacks(sliders, occ, rays):
+    empty = ~occ
+    attacks = np.zeros_like(sliders)
+    for n, mask in rays:
+        attacks |= _fill(sliders, empty, n, mask)
+    return attacks
+
+
+def attacked(pos, side):
+    """ (N,) map of the squares attacked by `side` """
+    occ = pos[:, -1]
+    us = side << 3
+    Q = pos[:, QUEEN | us]
+    return pawn_attacks(pos[:, PAWN | us], side) | \
+        knight_attacks(pos[:, KNIGHT | us]) | \
+        king_attacks(pos[:, KING | us]) | \
+        slider_attacks(pos[:, BISHOP | us] | Q, occ, _BISHOP_RAYS) | \
+        slider_attacks(pos[:, ROOK | us] | Q, occ, _ROOK_RAYS)
+
+
+### Table gathers ###
+
+def _on(bitboards):
+    """ (N, 64) bool: is square set in each bitboard """
+    return ((bitboards[:, None] >> SQUARES) & U64(1)).astype(bool)
+
+
+def _magic(occ, tables):
+    masks, magic, shifts, offsets, flat = tables
+    index = ((occ[:, None] & masks) * magic) >> shifts
+    return flat[offsets + index.astype(np.intp)]
+
+
+def attack_sets(pos, piece):
+    """ (N, 64) attack set of each `piece` on each square, 0 elsewhere """
+    on = _on(pos[:, piece])
+    kind, side = piece & 7, piece >> 3
+    if kind == PAWN:
+        attacks = np.broadcast_to(P_TABLE[side], on.shape)
+    elif kind == KING:
+        attacks = np.broadcast_to(K_TABLE, on.shape)
+    elif kind == KNIGHT:
+        attacks = np.broadcast_to(N_TABLE, on.shape)
+    else:
+        occ = pos[:, -1]
+        attacks = np.zeros(on.shape, dtype=np.uint64)
+        if kind in (BISHOP, QUEEN):
+            attacks |= _magic(occ, B_MAGIC)
+        if kind in (ROOK, QUEEN):
+            attacks |= _magic(occ, R_MAGIC)
+    return np.where(on, attacks, U64(0))
+
+
+def _pawn_moves(pos, side):
+    pawns = pos[:, PAWN | side << 3]
+    empty = ~pos[:, -1]
+    enemy = pos[:, OFFSET + (side ^ 1)]
+    promotion = PROMOTION_RANK[side]
+
+    if side == 0:
+        single = _north(pawns) & empty
+        double = _north(single & RANK_3) & empty
+        captures = (((pawns << U64(7)) & NOT_H & enemy),
+                    ((pawns << U64(9)) & NOT_A & enemy))
+    else:
+        single = _south(pawns) & empty
+        double = _south(single & RANK_6) & empty
+        captures = (((pawns >> U64(9)) & NOT_H & enemy),
+                    ((pawns >> U64(7)) & NOT_A & enemy))
+
+    count = popcount(double)
+    for targets in (single,) + captures:  # promotions count once per piece
+        count += popcount(targets & ~promotion) + 4 * popcount(targets & promotion)
+    return count
+
+
+def move_counts(pos, side):
+    """ (N,) number of pseudo-legal moves for `side` (0, 1 or an (N,) array)
+        excluding castling and en passant
+    """
+    if not np.isscalar(side):
+        side = np.asarray(side)
+        return np.where(side == 0, move_counts(pos, 0), move_counts(pos, 1))
+
+    nfriendly = ~pos[:, OFFSET + side]
+    count = _pawn_moves(pos, side)
+    for kind in (KING, KNIGHT, BISHOP, ROOK, QUEEN):
+        targets = attack_sets(pos, kind | side << 3) & nfriendly[:, None]
+        count += popcount(targets).sum(axis=1)
+    return count
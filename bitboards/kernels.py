@@ -0,0 +1,142 @@
+""" Interchangeable implementations of the bit twiddling primitives
+
+    Each kernel provides `bitscan` (index of the LSB), `popcount`,
+    `get_set_bits` (pop-LSB iteration, as a list of indexes) and
+    `mirror` (flip a bitboard horizontally):
+
+    parallel    the branchy parallel bitscan from `twiddling`
+    bit_length  isolate the LSB with `bb & -bb` and use `long.bit_length`
+    table       8 / 16-bit lookup tables
+
+    Which is fastest depends on the interpreter, so `fastest()` times
+    them on typical bitboards; `bitboards` runs it once per interpreter
+    and caches the answer (see `tables.py`).
+"""
+
+import random
+import timeit
+
+from . import twiddling
+
+
+### bit_length ###
+
+def bitscan_bl(bb):
+    return (bb & -bb).bit_length() - 1 if bb else 64
+
+
+def get_set_bits_bl(bb):
+    bits = []
+    while bb:
+        lsb = bb & -bb
+        bits.append(lsb.bit_length() - 1)
+        bb ^= lsb
+    return bits
+
+
+### table ###
+
+POPCOUNT_16 = [0] * 0x10000
+for i in xrange(1, 0x10000):
+    POPCOUNT_16[i] = POPCOUNT_16[i >> 1] + (i & 1)
+
+# BYTE_BITS[k][byte]: indexes of the set bits of `byte` as the k-th byte
+BYTE_BITS = [[tuple(k*8 + b for b in xrange(8) if byte & 1 << b)
+              for byte in xrange(256)] for k in xrange(8)]
+LSB_8 = [bits and bits[0] for bits in BYTE_BITS[0]]
+MIRROR_8 = [sum(1 << (7 - b) for b in bits) for bits in BYTE_BITS[0]]
+
+
+def bitscan_table(bb):
+    shift = 0
+    while shift < 64:
+        byte = bb >> shift & 0xFF
+        if byte:
+            return shift + LSB_8[byte]
+        shift += 8
+    return 64
+
+
+def popcount_table(bb):
+    return POPCOUNT_16[bb & 0xFFFF] + POPCOUNT_16[bb >> 16 & 0xFFFF] + \
+        POPCOUNT_16[bb >> 32 & 0xFFFF] + POPCOUNT_16[bb >> 48 & 0xFFFF]
+
+
+def get_set_bits_table(bb):
+    bits = []
+    k = 0
+    while bb:
+        byte = bb & 0xFF
+        if byte:
+            bits.extend(BYTE_BITS[k][byte])
+        bb >>= 8
+        k += 1
+    return bits
+
+
+def mirror_table(bb):
+    m = 0
+    for shift in xrange(0, 64, 8):
+        m |= MIRROR_8[bb >> shift & 0xFF] << shift
+    return m
+
+
+KERNELS = {
+    "parallel": {
+        "bitscan": twiddling.bitscan,
+        "popcount": twiddling.popcount,
+        "get_set_bits": twiddling.get_set_bits,
+        "mirror": twiddling.mirror,
+    },
+    "bit_length": {
+        "bitscan": bitscan_bl,
+        "popcount": twiddling.popcount,
+        "get_set_bits": get_set_bits_bl,
+        "mirror": twiddling.mirror,
+    },
+    "table": {
+        "bitscan": bitscan_table,
+        "popcount": popcount_table,
+        "get_set_bits": get_set_bits_table,
+        "mirror": mirror_table,
+    },
+}
+
+
+### Microbenchmarks ###
+
+def samples(n=64, rng=random.Random(0)):
+    """ Bitboards shaped like the ones move generation sees: mostly sparse
+        piece and target sets, some dense occupancies
+    """
+    boards = []
+    for i in xrange(n):
+        bits = rng.choice((1, 1, 2, 3, 4, 6, 8, 14, 32))
+        boards.append(sum(1 << sq for sq in rng.sample(xrange(64), bits)))
+    return boards
+
+
+def benchmark(number=20, boards=None):
+    """ {kernel: {function: seconds}} for `number` passes over `boards` """
+    boards = boards or samples()
+    results = {}
+    for name, kernel in KERNELS.items():
+        results[name] = {}
+        for function, f in kernel.items():
+            run = lambda: [f(b) for b in boards]
+            results[name][function] = min(timeit.repeat(run, number=number,
+                                                         repeat=3))
+    return results
+
+
+def fastest(weights=None):
+    """ Name of the kernel with the lowest weighted total time
+
+        :param weights: relative call frequency of each function, by
+                        default that of move generation
+    """
+    weights = weights or {"bitscan": 1, "popcount": 2, "get_set_bits": 8,
+                          "mirror": 0}
+    results = benchmark()
+    return min(results, key=lambda name: sum(
+        results[name][f] * w for f, w in weights.items()))
@@ -10,8 +10,10 @@ R_MASK = 0xFCFCFCFCFCFCFCFCL
 
 K_ATTACKS = [0L for _ in xrange(65)]                            # King attacks
 N_ATTACKS = [0x00L for _ in xrange(65)]                         # Knight attacks
-ATTACKS = [[0x00L for __ in xrange(256)] for _ in xrange(8)]    # 'Smeared' attacks for sliding pieces
+ATTACKS = []                                                    # 'Smeared' attacks for sliding pieces (lazy)
 P_ATTACKS = [[0x00L for __ in xrange(65)] for _ in xrange(2)]   # Pawn attacks
+BETWEEN = [[0x00L for __ in xrange(64)] for _ in xrange(64)]    # Squares between two aligned squares
+LINE = [[0x00L for __ in xrange(64)] for _ in xrange(64)]       # Full line through two aligned squares
 
 
 # Generate attack lookup tales for non-sliding pieces
@@ -68,13 +70,48 @@ for sq in xrange(65):
 
 
 # Attacks for all occupancy variations on first rank "smeared"
-# up over all ranks used to generate sliding piece attack sets
-for i in xrange(8):
-    for j in xrange(65):
-        occ = j<<1
-        sq = 1<<i
-
-        east = (occ - (2 * sq))                                 # fill east until first block (inclusive)
-        west = mirror(mirror(occ) - (2 * mirror(sq)))           # fill west until first block (inclusive)
-
-        ATTACKS[i][j] = ((east ^ west) & 0xFF) * A1H1           # smear 1st rank occupancy across all ranks
+# up over all ranks used to generate sliding piece attack sets.
+# Only the rotated slider lookups need these, so they are built on first use.
+def smeared_attacks():
+    if ATTACKS:
+        return ATTACKS
+
+    for i in xrange(8):
+        ATTACKS.append([0x00L for _ in xrange(256)])
+        for j in xrange(65):
+            occ = j<<1
+            sq = 1<<i
+
+            east = (occ - (2 * sq))                             # fill east until first block (inclusive)
+            west = mirror(mirror(occ) - (2 * mirror(sq)))       # fill west until first block (inclusive)
+
+            ATTACKS[i][j] = ((east ^ west) & 0xFF) * A1H1       # smear 1st rank occupancy across all ranks
+    return ATTACKS
+
+
+# Between / line masks for every pair of squares sharing a rank, file or
+# diagonal. Pairs that are not aligned are left empty.
+DIRECTIONS = ((1, 0), (1, 1), (0, 1), (-1, 1))                  # (file, rank) steps, opposites implied
+
+for sq in xrange(64):
+    f, r = sq & 7, sq >> 3
+    for df, dr in DIRECTIONS:
+        rays = []
+        for step in (1, -1):                                    # walk out both ways from sq
+            ray = []
+            ff, rr = f + df*step, r + dr*step
+            while 0 <= ff < 8 and 0 <= rr < 8:
+                ray.append(rr*8 + ff)
+                ff, rr = ff + df*step, rr + dr*step
+            rays.append(ray)
+
+        line = 1<<sq
+        for i in rays[0] + rays[1]:
+            line |= 1<<i
+
+        for ray in rays:
+            between = 0L
+            for i in ray:
+                BETWEEN[sq][i] = between
+                LINE[sq][i] = line
+                between |= 1<<i
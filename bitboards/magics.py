@@ -0,0 +1,143 @@
+""" Magic bitboard slider attacks
+
+    The occupancy of the squares a slider could be blocked on (its
+    relevant occupancy) is masked out, multiplied by a per-square magic
+    number and shifted down, giving a perfect hash into a table of
+    precomputed attack sets: one mask-multiply-shift-lookup per piece.
+
+    The magic numbers below were found with `find_magic`.
+"""
+
+import random
+
+from .masks import FULL
+from . import tables
+
+
+R_DIRECTIONS = ((1, 0), (-1, 0), (0, 1), (0, -1))       # (file, rank) steps
+B_DIRECTIONS = ((1, 1), (1, -1), (-1, 1), (-1, -1))
+
+ROOK_MAGICS = (
+    0x128012C0008000E0L, 0x0240002000401001L, 0x4100200041001008L, 0x8280100008018004L,
+    0x2080080002040080L, 0x1300010004008208L, 0x04000208A9101408L, 0x020000204A018F04L,
+    0x1080800040008020L, 0x0000C01000402001L, 0x0080808010002000L, 0x0408800800801000L,
+    0x0010800801040080L, 0x4804800400804200L, 0x0304800D00800200L, 0x010200040081006AL,
+    0x8280044020084000L, 0x042000C010004021L, 0x2010002004080020L, 0x0040210010000900L,
+    0x0008004004020041L, 0x0004008080040200L, 0x1C20040070610208L, 0x1020A20000508104L,
+    0x0100C00380008120L, 0x4001200280400080L, 0x0200100080200080L, 0x0000401200082200L,
+    0xC02C080080040080L, 0x0840040080020080L, 0x2102004040800100L, 0x0042079A00004104L,
+    0x0000400424800280L, 0x4820100020400040L, 0x5010002000801880L, 0x9061080081801002L,
+    0x208A050011000800L, 0x000200080E003094L, 0xA010018204003008L, 0x2000288042001401L,
+    0x400181C000228000L, 0x0200402010004000L, 0x8388928600420021L, 0x400021001001000AL,
+    0x2100080011010004L, 0x1002020004008080L, 0x0802000804020001L, 0x88004410408A0001L,
+    0x010508C030800100L, 0x4000400080310100L, 0x0030200010048080L, 0x2000800800100080L,
+    0x0100040008008080L, 0x0022000204008080L, 0x0108020170284400L, 0x1001010084004200L,
+    0x0004890141902202L, 0x0100881100220042L, 0x0100102001000841L, 0x4408050020081001L,
+    0x0002008884201002L, 0x2002000490410802L, 0x0020014800900204L, 0x0100082081044402L,
+)
+
+BISHOP_MAGICS = (
+    0x0010104088840042L, 0x0110104081004062L, 0x0091142082000100L, 0x0108208821008100L,
+    0x0101104000080000L, 0x010104200404001CL, 0x0C01040202C00010L, 0x0001004800841080L,
+    0xCA8B46100E280102L, 0x001010D00085024CL, 0x4180089881020120L, 0x8010082050411000L,
+    0x0800020210100000L, 0x0002120905201200L, 0xC000040404040510L, 0x0110410101100200L,
+    0x0042201408020C27L, 0xA882000404440C20L, 0x0002000102040100L, 0x800200202202C200L,
+    0x4002005012101401L, 0x2441014880600200L, 0x0214020104018400L, 0x000180004414410AL,
+    0x0105410C10020800L, 0x0004200084013400L, 0x200582045004001BL, 0x1000404004010200L,
+    0x0001001081004021L, 0x2400430202008628L, 0x000604C144230800L, 0x04004840008A1804L,
+    0x4010045000220210L, 0x2012100400500120L, 0x10001C0205900081L, 0x0020880800360A00L,
+    0x8500460020060080L, 0x0420008209010110L, 0x0010020250008C00L, 0x8010A40100004104L,
+    0x00008208400022C8L, 0x0008410450402100L, 0x0008920110004104L, 0x43A8011044002024L,
+    0x0029102021900602L, 0x2270101000212040L, 0x0020C41112004040L, 0x3004840550C42200L,
+    0x5002022202404480L, 0x0402822309200840L, 0x0032010423240048L, 0x2000CA0384110008L,
+    0x4001140410440000L, 0x2092E50810011010L, 0x0140040852005041L, 0x00200200C1010104L,
+    0x40120202020104E0L, 0xA000010042300500L, 0x400048004A009001L, 0x4200800400411081L,
+    0x0010040604105400L, 0x0107004210024080L, 0x0004423004210040L, 0xC220023088010040L,
+)
+
+def ray_attacks(sq, occ, directions, edges=True):
+    """ Slow attack set generation, walking each ray to the first blocker
+
+        :param edges: include the last square of each ray. Without it the
+                      result is the relevant occupancy mask for `sq`.
+    """
+    f, r = sq & 7, sq >> 3
+    attacks = 0L
+    for df, dr in directions:
+        ff, rr = f + df, r + dr
+        while 0 <= ff < 8 and 0 <= rr < 8:
+            if not edges and not (0 <= ff + df < 8 and 0 <= rr + dr < 8):
+                break
+            attacks |= 1 << (rr*8 + ff)
+            if occ >> (rr*8 + ff) & 1:
+                break
+            ff, rr = ff + df, rr + dr
+    return attacks
+
+
+def subsets(mask):
+    """ Every subset of the bits in `mask` (Carry-Rippler) """
+    occ = 0L
+    while True:
+        yield occ
+        occ = (occ - mask) & mask
+        if occ == 0:
+            break
+
+
+def find_magic(sq, directions, rng=random):
+    """ Search for a magic number mapping every relevant occupancy of `sq`
+        to a table index without destructive collisions
+    """
+    mask = ray_attacks(sq, 0L, directions, edges=False)
+    shift = 64 - bin(mask).count('1')
+    occs = list(subsets(mask))
+    attacks = [ray_attacks(sq, occ, directions) for occ in occs]
+
+    while True:
+        magic = rng.getrandbits(64) & rng.getrandbits(64) & rng.getrandbits(64)
+        if bin((mask * magic) & 0xFF00000000000000L).count('1') < 6:
+            continue
+
+        table = {}
+        for occ, attack in zip(occs, attacks):
+            i = ((occ * magic) & FULL) >> shift
+            if table.setdefault(i, attack) != attack:
+                break
+        else:
+            return magic
+
+
+def build(magics, directions):
+    """ Masks, shifts and attack tables for one slider type """
+    masks, shifts, tables = [], [], []
+    for sq in xrange(64):
+        mask = ray_attacks(sq, 0L, directions, edges=False)
+        shift = 64 - bin(mask).count('1')
+        table = [0L] * (1 << (64 - shift))
+        for occ in subsets(mask):
+            i = ((occ * magics[sq]) & FULL) >> shift
+            table[i] = ray_attacks(sq, occ, directions)
+
+        masks.append(mask)
+        shifts.append(shift)
+        tables.append(table)
+    return masks, shifts, tables
+
+
+def _key(magics):
+    return "%08x" % (hash(magics) & 0xFFFFFFFF)  # rebuild if magics change
+
+
+R_MASKS, R_SHIFTS, R_TABLES = tables.cached(
+    "rook-magics", lambda: build(ROOK_MAGICS, R_DIRECTIONS), _key(ROOK_MAGICS))
+B_MASKS, B_SHIFTS, B_TABLES = tables.cached(
+    "bishop-magics", lambda: build(BISHOP_MAGICS, B_DIRECTIONS), _key(BISHOP_MAGICS))
+
+
+def R_attacks(occ, sq):
+    return R_TABLES[sq][(((occ & R_MASKS[sq]) * ROOK_MAGICS[sq]) & FULL) >> R_SHIFTS[sq]]
+
+
+def B_attacks(occ, sq):
+    return B_TABLES[sq][(((occ & B_MASKS[sq]) * BISHOP_MAGICS[sq]) & FULL) >> B_SHIFTS[sq]]
@@ -1,5 +1,6 @@
 from .masks import *
 from .lookups import *
+from . import magics
 
 
 # Non-sliding piece attacks
@@ -14,7 +15,9 @@ def N_attacks(occ, sq):
 
 # Sliding piece attacks
 
-def R_attacks(occ, sq):
+def R_attacks_rotated(occ, sq):
+    if not ATTACKS:
+        smeared_attacks()
 
     def rank(occ, sq):
         i = sq >> 3                                     # get rank index
@@ -36,7 +39,9 @@ def R_attacks(occ, sq):
     return rank(occ, sq) | file_(occ, sq)
 
 
-def B_attacks(occ, sq):
+def B_attacks_rotated(occ, sq):
+    if not ATTACKS:
+        smeared_attacks()
 
     def diag(occ, sq):
         i = 7 + (sq >> 3) - (sq & 7)
@@ -57,4 +62,18 @@ def B_attacks(occ, sq):
 def Q_attacks(occ, sq):
     return R_attacks(occ, sq) | B_attacks(occ, sq)
 
-attacks = (None, K_attacks, N_attacks, B_attacks, R_attacks, Q_attacks)
+
+# Slider attack backends: (rook, bishop) attack functions
+SLIDERS = {
+    "rotated": (R_attacks_rotated, B_attacks_rotated),
+    "magic": (magics.R_attacks, magics.B_attacks),
+}
+
+
+def use_sliders(name):
+    """ Select the slider attack backend used by `R_attacks` & co. """
+    global R_attacks, B_attacks, attacks
+    R_attacks, B_attacks = SLIDERS[name]
+    attacks = (None, K_attacks, N_attacks, B_attacks, R_attacks, Q_attacks)
+
+use_sliders("magic")
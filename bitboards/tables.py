@@ -0,0 +1,49 @@
+""" Generated lookup tables, cached on disk
+
+    Large tables are built once and written to CACHE_DIR as marshal
+    files, so later imports (and every freshly spawned worker process)
+    only have to load them. File names carry VERSION, a key describing
+    the table's inputs and the interpreter, so a stale or foreign file
+    is never read. Bump VERSION whenever the way a table is generated
+    changes.
+"""
+
+import marshal
+import os
+import platform
+import sys
+import tempfile
+
+
+VERSION = 1
+CACHE_DIR = os.environ.get("CHESSVAL_TABLES", os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "__tables__"))
+
+
+def path(name, key=""):
+    interpreter = "%s%i%i" % ((platform.python_implementation().lower(),) +
+                              sys.version_info[:2])
+    return os.path.join(CACHE_DIR, "%s%s-v%i-%s.marshal" % (
+        name, key and "-%s" % key, VERSION, interpreter))
+
+
+def cached(name, build, key=""):
+    """ Load table `name` from the cache, building and saving it if needed """
+    filename = path(name, key)
+    try:
+        with open(filename, 'rb') as f:
+            return marshal.load(f)
+    except (IOError, EOFError, ValueError, TypeError):
+        pass
+
+    table = build()
+    try:
+        if not os.path.isdir(CACHE_DIR):
+            os.makedirs(CACHE_DIR)
+        fd, tmp = tempfile.mkstemp(dir=CACHE_DIR)
+        with os.fdopen(fd, 'wb') as f:
+            marshal.dump(table, f)
+        os.rename(tmp, filename)  # atomic: readers never see a partial file
+    except (IOError, OSError):
+        pass  # read-only install, the table is rebuilt on every import
+    return table
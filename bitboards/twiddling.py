@@ -77,3 +77,8 @@ def get_set_bits(bb):
         bits.append(bit)
         bb &= ~(1 << bit) & 0xFFFFFFFFFFFFFFFFL
     return bits
+
+
+def popcount(bb):
+    """ Number of set bits """
+    return bin(bb).count('1')
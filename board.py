@@ -1,14 +1,55 @@
 import logging
+from array import array
 
 from constants import *
 from serialization import Serializer
 import bitboards as bb
 import move
+import evaluation
+import zobrist
 
 
 OFFSET = 14
 MAX_MOVES = 100
 
+# Bitboards are kept in an unsigned 64-bit array where the C long is 64
+# bits; Python 2 arrays have no 'Q' typecode, so elsewhere (e.g. 64-bit
+# Windows) they fall back to a plain list. Squares are signed bytes.
+if array('L').itemsize == 8:
+    def bitboard_array(values):
+        return array('L', values)
+else:
+    bitboard_array = list
+SQUARE = 'b'
+NO_POSITIONS = bitboard_array([0] * 17)
+NO_OCCUPANCY = array(SQUARE, [-1] * 64)
+
+# Irreversible state is kept on a preallocated undo stack, one record of
+# UNDO_SIZE slots per ply, room for UNDO_PLIES plies (doubled as needed).
+UNDO_PLIES = 16
+# Record layout:
+UNDO_CPIECE = 0     # captured piece or -1
+UNDO_CASTLING = 1   # castling rights
+UNDO_EP = 2         # en passant square or 0
+UNDO_HALF_MOVES = 3 # half move clock
+UNDO_HASH = 4       # zobrist key
+UNDO_SIZE = 5
+
+# Castling rights kept when a piece moves from or to each square
+CASTLING_MASK = [0xF] * 64
+CASTLING_MASK[0] ^= castling.WHITE_000
+CASTLING_MASK[7] ^= castling.WHITE_00
+CASTLING_MASK[4] ^= castling.WHITE_000 | castling.WHITE_00
+CASTLING_MASK[56] ^= castling.BLACK_000
+CASTLING_MASK[63] ^= castling.BLACK_00
+CASTLING_MASK[60] ^= castling.BLACK_000 | castling.BLACK_00
+
+# Static exchange evaluation: piece values by type (pawn, king, knight,
+# bishop, rook, queen) and the order attackers are brought in
+SEE_VALUES = (100, 20000, 320, 330, 500, 900)
+SEE_ORDER = (WHITE_PAWN, WHITE_KNIGHT, WHITE_BISHOP, WHITE_ROOK, WHITE_QUEEN,
+             WHITE_KING)
+
 
 class InvalidMove(ValueError):
     pass
@@ -20,19 +61,56 @@ class KingInCheck(ValueError):
 
 class Board(Serializer):
 
-    player = WHITE
-    ep = None  # en passant square
-    castling = 0x00  # castling rights
-
-    full_moves = 1
-    half_moves = 0
-
-    # [00-13] list of bitboards foreach piece type
-    # [14-16] aggregated bitboards: w / b / all
-    positions = [0x0L] * 17
-    occupancy = [-1] * 64
-    moves = []
-    king = [-1, -1]
+    __slots__ = (
+        "player",
+        "ep",           # en passant square
+        "castling",     # castling rights
+        "full_moves",
+        "half_moves",
+        "hash",         # zobrist key, see `zobrist.py`
+        "mg",           # middlegame, endgame and phase sums,
+        "eg",           #   see `evaluation.py`
+        "phase",
+        "positions",    # [00-13] bitboards foreach piece type
+                        # [14-16] aggregated bitboards: w / b / all
+        "occupancy",    # piece on each square, or -1
+        "king",         # king square foreach player
+        "moves",        # packed moves, see `move.py`
+        "undo",         # undo stack, see UNDO_*
+        "checks",       # cached `_check_info()` for this ply, or None
+        "track_attacks",
+        "attacks",      # attack set of the piece on each square,
+        "attackers",    #   and the pieces attacking each square (tracked)
+    )
+
+    def __init__(self, fen=INITIAL_FEN, track_attacks=False):
+        """ :param track_attacks: keep per-square attacker sets up to date
+                                  in `pickup` / `drop`, so `is_attacked`
+                                  and check detection are a mask test
+        """
+        self.track_attacks = track_attacks
+        self.reset(fen)
+
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            setattr(self, name, value)
+
+    def copy(self):
+        """ An independent copy of the board, including its move history """
+        board = self.__class__.__new__(self.__class__)
+        board.__setstate__(self.__getstate__())
+        board.positions = bitboard_array(self.positions)
+        board.occupancy = array(SQUARE, self.occupancy)
+        board.king = self.king[:]
+        board.moves = self.moves[:]
+        board.undo = self.undo[:]
+        if self.track_attacks:
+            board.attacks = self.attacks[:]
+            board.attackers = self.attackers[:]
+        return board
 
     def pickup(self, piece, at):
         # pickup the pieces (Average White Band style)
@@ -43,6 +121,14 @@ class Board(Serializer):
         self.positions[piece] &= mask
         self.positions[OFFSET + player] &= mask
         self.positions[-1] &= mask
+        self.hash ^= zobrist.PIECE_SQ[piece][at]
+        self.mg -= evaluation.MG[piece][at]
+        self.eg -= evaluation.EG[piece][at]
+        self.phase -= evaluation.PHASE[piece]
+
+        if self.track_attacks:
+            self._retarget(at, 0)
+            self._extend_rays(at)
 
     def drop(self, piece, at):
         ### drop pieces
@@ -53,18 +139,91 @@ class Board(Serializer):
         self.positions[piece] |= sq
         self.positions[OFFSET + player] |= sq
         self.positions[-1] |= sq
+        self.hash ^= zobrist.PIECE_SQ[piece][at]
+        self.mg += evaluation.MG[piece][at]
+        self.eg += evaluation.EG[piece][at]
+        self.phase += evaluation.PHASE[piece]
+
+        if self.track_attacks:
+            self._retarget(at, self._piece_attacks(piece, at))
+            self._extend_rays(at)
+
+    ### Tracked attacker sets ###
+
+    def _piece_attacks(self, piece, sq):
+        if piece & 7 == WHITE_PAWN:
+            return bb.P_ATTACKS[piece>>3][sq]
+        return bb.attacks[piece & 7](self.positions[-1], sq)
+
+    def _retarget(self, sq, targets):
+        """ Make `targets` the attack set of the piece on `sq` """
+        attackers = self.attackers
+        bit = 1<<sq
+        for to in bb.get_set_bits(self.attacks[sq] ^ targets):
+            attackers[to] ^= bit
+        self.attacks[sq] = targets
+
+    def _extend_rays(self, sq):
+        """ Recompute the sliders attacking `sq`, whose rays now stop at or
+            pass through it
+        """
+        B, R = self._sliders()
+        occupancy = self.occupancy
+        for frm in bb.get_set_bits(self.attackers[sq] & (B | R)):
+            self._retarget(frm, self._piece_attacks(occupancy[frm], frm))
+
+    def _track(self):
+        """ Attacker sets for the whole board, from scratch """
+        self.attacks = [0L] * 64
+        self.attackers = [0L] * 64
+        for sq in bb.get_set_bits(self.positions[-1]):
+            self._retarget(sq, self._piece_attacks(self.occupancy[sq], sq))
 
     def reset(self, fen=INITIAL_FEN):
-        self.positions = [0x0L] * 17
-        self.occupancy = [-1] * 64
+        self.positions = bitboard_array(NO_POSITIONS)
+        self.occupancy = array(SQUARE, NO_OCCUPANCY)
+        self.player = WHITE
         self.ep = None
         self.castling = 0
-        full_moves = 1
-        half_moves = 0
+        self.full_moves = 1
+        self.half_moves = 0
         self.moves = []
-        king = [-1, -1]
+        self.undo = [0] * (UNDO_PLIES * UNDO_SIZE)
+        self.king = [-1, -1]
         self.setboard(fen)
 
+    def setboard(self, fen):
+        Serializer.setboard(self, fen)
+        self._loaded()
+
+    @classmethod
+    def from_bytes(cls, data, track_attacks=False):
+        """ A new board for a position packed by `to_bytes` """
+        board = cls(track_attacks=track_attacks)
+        board.unpack_from(data)
+        return board
+
+    def unpack_from(self, buf, offset=0):
+        """ Load the position packed at `buf[offset:]` by `pack_into`,
+            reusing the board's storage
+        """
+        self.positions[:] = NO_POSITIONS
+        self.occupancy[:] = NO_OCCUPANCY
+        self.king[:] = -1, -1
+        del self.moves[:]
+        Serializer.setbytes(self, buf, offset)
+        self._loaded()
+
+    def _loaded(self):
+        """ Derive the key and cached state of a newly loaded position """
+        self.hash = zobrist.compute(self)
+        self.mg, self.eg, self.phase = evaluation.compute(self)
+        self.checks = None
+        if self.track_attacks:
+            self._track()
+        else:
+            self.attacks = self.attackers = None
+
     def is_legal(self, frm, to, promotion=None):
         """ Check if move frm sq `frm` to square `to` is legal
             :todo: add check detection
@@ -79,9 +238,15 @@ class Board(Serializer):
             self.unmakemove()
             return True
 
-    def is_attacked(self, sq, by):
+    def is_attacked(self, sq, by, occ=None):
+        """ Is `sq` attacked by player `by`?
+            :param occ: occupancy to use for sliders, defaults to the board
+        """
         pos = self.positions
-        occ = pos[-1]
+        if occ is None:
+            if self.track_attacks:
+                return self.attackers[sq] & pos[OFFSET + by] != 0
+            occ = pos[-1]
         by_offset = by<<3
 
         P = pos[WHITE_PAWN | by_offset]
@@ -97,6 +262,95 @@ class Board(Serializer):
 
         return False
 
+    def attackers_to(self, sq, occ=None):
+        """ Bitboard of the pieces of both colours attacking `sq`
+            :param occ: occupancy to use for sliders, defaults to the board;
+                        pieces missing from it do not attack
+        """
+        pos = self.positions
+        if occ is None:
+            if self.track_attacks:
+                return self.attackers[sq]
+            occ = pos[-1]
+        B, R = self._sliders()
+
+        return ((bb.P_ATTACKS[BLACK][sq] & pos[WHITE_PAWN]) |
+                (bb.P_ATTACKS[WHITE][sq] & pos[BLACK_PAWN]) |
+                (bb.N_ATTACKS[sq] & (pos[WHITE_KNIGHT] | pos[BLACK_KNIGHT])) |
+                (bb.K_ATTACKS[sq] & (pos[WHITE_KING] | pos[BLACK_KING])) |
+                (bb.B_attacks(occ, sq) & B) | (bb.R_attacks(occ, sq) & R)) & occ
+
+    def _sliders(self):
+        """ (bishops and queens, rooks and queens) of both colours """
+        pos = self.positions
+        Q = pos[WHITE_QUEEN] | pos[BLACK_QUEEN]
+        return pos[WHITE_BISHOP] | pos[BLACK_BISHOP] | Q, \
+            pos[WHITE_ROOK] | pos[BLACK_ROOK] | Q
+
+    def see(self, m):
+        """ Static exchange evaluation of move `m`: the material the side
+            to move wins (or, if negative, loses) when both sides keep
+            recapturing on the target square with their least valuable
+            attacker, each free to stop when further captures would not pay
+
+            Removing a capturer from the occupancy and recomputing the
+            slider attacks brings in the X-ray attackers behind it.
+        """
+        frm, to, flags, promotion = move.unpack(m)
+        pos = self.positions
+        occ = pos[-1] ^ (1<<frm)
+        B, R = self._sliders()
+
+        if flags & move.flags.EP:
+            occ ^= 1<<(to ^ 8)  # the captured pawn is behind `to`
+            gain = [SEE_VALUES[WHITE_PAWN]]
+        else:
+            captured = self.occupancy[to]
+            gain = [captured != -1 and SEE_VALUES[captured & 7] or 0]
+        on_square = SEE_VALUES[self.occupancy[frm] & 7]
+        if promotion:
+            gain[0] += SEE_VALUES[promotion & 7] - SEE_VALUES[WHITE_PAWN]
+            on_square = SEE_VALUES[promotion & 7]
+
+        attackers = self.attackers_to(to, occ)
+        side = self.player^1
+        last_rank = to >> 3 in (0, 7)
+        d = 0
+        while True:
+            mine = attackers & pos[OFFSET + side]
+            if not mine:
+                break
+            for kind in SEE_ORDER:
+                bits = mine & pos[kind | side<<3]
+                if bits:
+                    break
+            # the king cannot capture onto a defended square, counting
+            # sliders that the king itself hides from it
+            if kind == WHITE_KING and self.attackers_to(to, occ ^ bits) & \
+                    pos[OFFSET + (side^1)]:
+                break
+
+            d += 1
+            gain.append(on_square - gain[d-1])
+            on_square = SEE_VALUES[kind]
+            if kind == WHITE_PAWN and last_rank:
+                gain[d] += SEE_VALUES[WHITE_QUEEN] - SEE_VALUES[WHITE_PAWN]
+                on_square = SEE_VALUES[WHITE_QUEEN]
+
+            occ ^= bits & -bits
+            # sliders behind the capturer now see the square
+            if kind in (WHITE_PAWN, WHITE_BISHOP, WHITE_QUEEN):
+                attackers |= bb.B_attacks(occ, to) & B
+            if kind in (WHITE_ROOK, WHITE_QUEEN):
+                attackers |= bb.R_attacks(occ, to) & R
+            attackers &= occ
+            side ^= 1
+
+        while d:
+            gain[d-1] = -max(-gain[d-1], gain[d])
+            d -= 1
+        return gain[0]
+
     def makemove(self, frm, to, promotion=None):
         """ Make a (legal) move 
             :todo: add castling moves
@@ -106,7 +360,6 @@ class Board(Serializer):
         occ = self.positions[-1]
         friendly = self.positions[OFFSET + self.player]
         piece = self.occupancy[frm]
-        cr = self.castling
         d = frm - to
         is_castling = piece % 8 == WHITE_KING and d in [-2, 2]  # todo do this properly
 
@@ -121,8 +374,12 @@ class Board(Serializer):
                 raise InvalidMove("Only pawns can be promoted")
             if not 1 << to & bb.masks.RANK_MASK[7*(self.player^1)]:
                 raise InvalidMove("Pawn cannot be promoted here")
-            if (promotion & 8) >> 3 != self.player:
+            if (promotion & 8) >> 3 != self.player or \
+                    not WHITE_KNIGHT <= promotion & 7 <= WHITE_QUEEN:
                 raise InvalidMove("Invalid promotion piece")
+        elif piece % 8 == WHITE_PAWN and \
+                1 << to & bb.masks.RANK_MASK[7*(self.player^1)]:
+            raise InvalidMove("Pawn must be promoted")
 
         # pawns are a special case
         if piece % 8 == WHITE_PAWN:
@@ -132,18 +389,20 @@ class Board(Serializer):
 
             # if delta is congruent modulo. 8, this is pawn push
             if delta and delta % 8 == 0:  
-                if delta % 16 == 0:  # double push
+                if (delta < 0 and self.player == WHITE) or\
+                        (delta > 0 and self.player == BLACK):
+                    raise InvalidMove("Pawns cannot push backwards")
+
+                if abs(delta) == 16:  # double push
                     p_pawns = bb.P_dpushes[self.player](my_pawns, empty)
-                else:  # single push
+                elif abs(delta) == 8:  # single push
                     p_pawns = bb.P_spushes[self.player](my_pawns, empty)
+                else:
+                    raise InvalidMove("Pawns push one or two squares")
 
                 if p_pawns & (1<<frm) == 0L:
                     raise InvalidMove("Pawn not able to push")
 
-                if (delta < 0 and self.player == WHITE) or\
-                        (delta > 0 and self.player == BLACK):
-                    raise InvalidMove("Pawns cannot push backwards")
-
             else:  # check for pawn attacks
                 enemy = self.positions[OFFSET + (self.player ^ 1)]
 
@@ -161,11 +420,16 @@ class Board(Serializer):
             if is_castling:
                 if self.castling & (1<<self.player*2) and d == -2:
                     rook_sq = frm + 1  # king side castle
+                    between = 0x60 << self.player*56
                 elif self.castling & (2<<self.player*2) and d == 2:
                     rook_sq = frm - 1  # queen side castle
+                    between = 0x0E << self.player*56
                 else:
                     raise InvalidMove("Castling not allowed")
 
+                # the squares between king and rook, `to` among them
+                if occ & between:
+                    raise InvalidMove("Castling not allowed: pieces in the way")
                 if self.is_attacked(rook_sq, self.player^1):
                     raise InvalidMove("Castling not allowed: King passes through attacked square")
                 if self.is_attacked(frm, self.player^1):
@@ -178,35 +442,58 @@ class Board(Serializer):
                     raise InvalidMove("Invalid slider target sq")
 
 
-        #################
-        ##### Make move #
-        piece = self.occupancy[frm]
-        cpiece = self.occupancy[to]
+        ### build the move and make it
         flags = 0
+        if is_castling:
+            flags = to > frm and move.flags.KCASTLE or move.flags.QCASTLE
+        elif piece % 8 == WHITE_PAWN and to == self.ep:
+            flags = move.flags.EP | move.flags.CAPTURE
+        elif self.occupancy[to] != -1:
+            flags = move.flags.CAPTURE
+        if piece % 8 == WHITE_PAWN and (to - frm) % 16 == 0:
+            flags |= move.flags.DPUSH
+
+        self.make(move.new(frm, to, flags, promotion))
+        if self.is_attacked(self.king[self.player^1], self.player):
+            self.unmake()
+            raise KingInCheck()
 
-        ### pickup the pieces
-        self.pickup(piece, frm)
+    def make(self, m):
+        """ Make a move produced by `move_list`, without validating it
 
-        # special case: castling is a compound move, pickup both pieces
-        if is_castling:
-            rook_sq = to > frm and frm + 3 or frm - 4
-            self.pickup(WHITE_ROOK | self.player<<3, rook_sq)
+            Internal callers that already hold a generated (legal) move
+            should use this; user input goes through `makemove`.
+        """
+        frm = m & move.SQ_MASK
+        to = m >> move.TO_SHIFT & move.SQ_MASK
+        promotion = m >> move.PROMOTION_SHIFT & move.PROMOTION_MASK
+        flags = m >> move.FLAGS_SHIFT
 
+        player = self.player
+        piece = self.occupancy[frm]
+        cpiece = self.occupancy[to]
+        cr = self.castling
 
-        # handle capture
-        if cpiece > -1:
-            mask = bb.masks.FULL ^ (1 << to)
-            self.positions[cpiece] &= mask
-            self.positions[OFFSET + (self.player^1)] &= mask
-            flags |= move.flags.CAPTURE
+        # store irreversible state
+        undo = self.undo
+        i = len(self.moves) * UNDO_SIZE
+        if i == len(undo):
+            undo.extend([0] * len(undo))
+        undo[i + UNDO_CASTLING] = cr
+        undo[i + UNDO_EP] = self.ep or 0
+        undo[i + UNDO_HALF_MOVES] = self.half_moves
+        undo[i + UNDO_HASH] = self.hash
+        ep_key = self.ep and zobrist.ep_key(self.ep, player, self.positions)
 
-        elif to == self.ep and piece % 8 == WHITE_PAWN:  # handle en passant capture
-            oppnt = self.player^1
-            oppnt_pawn = to - 8 + self.player*16
-            cpiece = WHITE_PAWN | oppnt<<3
-            self.pickup(cpiece, oppnt_pawn)
+        ### pickup the pieces
+        if flags & move.flags.EP:  # the captured pawn is behind `to`
+            cpiece = WHITE_PAWN | (player^1)<<3
+            self.pickup(cpiece, to - 8 + player*16)
+        elif cpiece != -1:
+            self.pickup(cpiece, to)
+        undo[i + UNDO_CPIECE] = cpiece
 
-            flags |= move.flags.EP | move.flags.CAPTURE
+        self.pickup(piece, frm)
 
         ### drop the pieces
         if promotion:
@@ -214,120 +501,424 @@ class Board(Serializer):
         else:
             self.drop(piece, to)
 
-        if is_castling:
-            rook_sq = to > frm and frm + 1 or frm - 1
-            self.drop(WHITE_ROOK | self.player<<3, rook_sq)
+        # special case: castling is a compound move, move the rook too
+        rook = WHITE_ROOK | player<<3
+        if flags & move.flags.KCASTLE:
+            self.pickup(rook, frm + 3)
+            self.drop(rook, frm + 1)
+        elif flags & move.flags.QCASTLE:
+            self.pickup(rook, frm - 4)
+            self.drop(rook, frm - 1)
 
         # update king position (for check detection)
         if piece % 8 == WHITE_KING:
-            self.king[self.player] = to
-
-        ### store pieces TODO
-        ### retrieve pieces TODO
+            self.king[player] = to
 
         ### update game status
-        if cpiece > -1 or piece % 8 == WHITE_PAWN:
+        if cpiece != -1 or piece % 8 == WHITE_PAWN:
             self.half_moves = 0
         else:
             self.half_moves += 1
 
+        self.castling = cr & CASTLING_MASK[frm] & CASTLING_MASK[to]
+        self.hash ^= zobrist.CASTLING[cr] ^ zobrist.CASTLING[self.castling]
 
-        W_rooks = self.positions[WHITE_ROOK]
-        W_king = self.king[WHITE]
-        B_rooks = self.positions[WHITE_ROOK | 8]
-        B_king = self.king[BLACK]
-        if not (1<<7 & W_rooks and W_king == 4):
-            self.castling &= 0xF ^ castling.WHITE_00
-        if not (1 & W_rooks and W_king == 4):
-            self.castling &= 0xF ^ castling.WHITE_000
-        if not (1<<63 & B_rooks and B_king == 60):
-            self.castling &= 0xF ^ castling.BLACK_00
-        if not (1<<56 & B_rooks and B_king == 60):
-            self.castling &= 0xF ^ castling.BLACK_000
-
-        if is_castling:
-            if to > frm:  # king-side
-                flags |= move.flags.KCASTLE
-            else:  # queen-side
-                flags |= move.flags.QCASTLE
-
-        self.full_moves += self.player  # update on black
-        self.player ^= 1
-
-        # set or reset en passant square
+        # set or reset en passant square; the key only includes its file
+        # while an enemy pawn stands ready to capture (see `zobrist.py`)
+        if self.ep:
+            self.hash ^= ep_key
         self.ep = None
-        if piece % 8 == WHITE_PAWN:
-            # if frm and to are congruent modulo 16, this is a dbl pawn push.
-            delta = to - frm
-            if delta % 16 == 0:
-                self.ep = frm + (delta/2)
-                flags |= move.flags.DPUSH
-
-        self.moves.append(move.new(frm, to, cpiece, flags, cr, promotion))
-        if self.is_attacked(self.king[self.player^1], self.player):
-            self.unmakemove()
-            raise KingInCheck()
-
-    def unmakemove(self):
-        mv = self.moves.pop()
-        logging.debug("unmakemove: %s", mv)
-        frm, to, cpiece, flags, cr, promotion = mv
-        friendly_rook = WHITE_ROOK | (self.player^1)<<3  # for castling
+        if flags & move.flags.DPUSH:
+            self.ep = (frm + to) >> 1
+            self.hash ^= zobrist.ep_key(self.ep, player^1, self.positions)
 
+        self.full_moves += player  # update on black
+        self.player ^= 1
+        self.hash ^= zobrist.SIDE
+        self.moves.append(m)
+        self.checks = None
+
+    def unmake(self):
+        """ Take back the last move """
+        m = self.moves.pop()
+        frm = m & move.SQ_MASK
+        to = m >> move.TO_SHIFT & move.SQ_MASK
+        flags = m >> move.FLAGS_SHIFT
+
+        player = self.player^1  # the side that made the move
+        undo = self.undo
+        i = len(self.moves) * UNDO_SIZE
         piece = self.occupancy[to]
-        frm_sq = 1 << frm
-        to_sq = 1 << to
-
 
-        ### pickup pieces
+        ### put the pieces back
         self.pickup(piece, to)
-
-        if flags & move.flags.KCASTLE:
-            self.pickup(friendly_rook, frm + 1)
-        elif flags & move.flags.QCASTLE:
-            self.pickup(friendly_rook, frm - 1)
-
-
-        ### drop pieces
-        if promotion:
-            self.drop(WHITE_PAWN | (self.player^1)<<3, frm)
+        if m >> move.PROMOTION_SHIFT & move.PROMOTION_MASK:
+            self.drop(WHITE_PAWN | player<<3, frm)
         else:
             self.drop(piece, frm)
 
+        rook = WHITE_ROOK | player<<3
         if flags & move.flags.KCASTLE:
-            self.drop(friendly_rook, frm + 3)
+            self.pickup(rook, frm + 1)
+            self.drop(rook, frm + 3)
         elif flags & move.flags.QCASTLE:
-            self.drop(friendly_rook, frm - 4)
-
+            self.pickup(rook, frm - 1)
+            self.drop(rook, frm - 4)
 
         # update king position (for check detection)
         if piece % 8 == WHITE_KING:
-            self.king[self.player ^ 1] = frm
-
+            self.king[player] = frm
 
         if flags & move.flags.EP:  # revert en passant capture
-            oppnt_pawn = to - 8 + (self.player^1) * 16
-            self.drop(cpiece, oppnt_pawn)
+            self.drop(undo[i + UNDO_CPIECE], to - 8 + player*16)
         elif flags & move.flags.CAPTURE:  # revert capture
-            self.drop(cpiece, to)
+            self.drop(undo[i + UNDO_CPIECE], to)
 
-        ### store pieces TODO
-        ### retrieve pieces TODO
-        ### update game status
-        # TODO how do we restore the half move counter?
+        ### restore game status
+        self.player = player
+        self.full_moves -= player  # update on black
+        self.castling = undo[i + UNDO_CASTLING]
+        self.ep = undo[i + UNDO_EP] or None
+        self.half_moves = undo[i + UNDO_HALF_MOVES]
+        self.hash = undo[i + UNDO_HASH]
+        self.checks = None
 
-        self.ep = None
-        # restore ep square
-        if self.moves:
-            pfrm, pto, pcpiece, pflags, pcr, ppromotion = self.moves[-1]
-            if pflags & move.flags.DPUSH:
-                self.ep = pfrm + (pto - pfrm) / 2
+    unmakemove = unmake
 
-        self.player ^= 1
-        self.full_moves -= self.player  # update on black
-        self.castling = cr
+    def _attackers(self, sq, by, occ=None):
+        """ Bitboard of `by`'s pieces attacking `sq` """
+        return self.attackers_to(sq, occ) & self.positions[OFFSET + by]
+
+    def _pinned(self, king_sq):
+        """ Bitboard of the side to move's pieces pinned to its king """
+        pos = self.positions
+        them = (self.player^1)<<3
+        occ = pos[-1]
+        friendly = pos[OFFSET + self.player]
+        enemy = pos[OFFSET + (self.player^1)]
+
+        # enemy sliders that would attack the king through friendly pieces
+        Q = pos[WHITE_QUEEN | them]
+        snipers = (bb.B_attacks(enemy, king_sq) & (pos[WHITE_BISHOP | them] | Q)) |\
+            (bb.R_attacks(enemy, king_sq) & (pos[WHITE_ROOK | them] | Q))
+
+        pinned = 0L
+        for sq in bb.get_set_bits(snipers):
+            blockers = bb.BETWEEN[king_sq][sq] & occ
+            if blockers & (blockers - 1) == 0 and blockers & friendly:
+                pinned |= blockers
+        return pinned
+
+    def _check_info(self):
+        """ (king square, checkers, pinned pieces) for the side to move,
+            computed once per ply
+        """
+        if self.checks is None:
+            king_sq = self.king[self.player]
+            checkers = self._attackers(king_sq, self.player^1)
+            self.checks = king_sq, checkers, self._pinned(king_sq)
+        return self.checks
+
+    def _king_occupancy(self, king_sq, checkers):
+        """ Occupancy to test king targets against: the king is lifted off
+            the board so it cannot hide from a slider behind itself. Out
+            of check no slider ray reaches the king, so tracked attacker
+            sets can answer instead (None).
+        """
+        if self.track_attacks and not checkers:
+            return None
+        return self.positions[OFFSET + ALL] ^ (1<<king_sq)
+
+    def _castling_moves(self, king_sq):
+        """ Castling moves for the side to move, which must not be in check """
+        moves = []
+        player = self.player
+        oppnt = player^1
+        empty = ~self.positions[OFFSET + ALL] & bb.masks.FULL
+        C_000 = 0x0E << player*56
+        C_00 = 0x60 << player*56
+
+        if self.castling & (2<<player*2) and C_000 & empty == C_000 and\
+                not self.is_attacked(king_sq - 1, oppnt) and\
+                not self.is_attacked(king_sq - 2, oppnt):
+            # player can queenside castle
+            moves.append(move.new(king_sq, king_sq - 2, move.flags.QCASTLE))
+
+        if self.castling & (1<<player*2) and C_00 & empty == C_00 and\
+                not self.is_attacked(king_sq + 1, oppnt) and\
+                not self.is_attacked(king_sq + 2, oppnt):
+            # player can king side castle
+            moves.append(move.new(king_sq, king_sq + 2, move.flags.KCASTLE))
+
+        return moves
 
     def move_list(self):
+        """ Generate legal moves
+
+            Checkers and pinned pieces are found once per position, and
+            every target set is masked with them, so (apart from the rare
+            en passant capture) no move is made and unmade to test it.
+        """
+        return list(self.generate_moves())
+
+    def generate_moves(self, quiet=True):
+        """ Yield legal moves in stages, each generated on demand: captures
+            and promotions, then castling, then quiet moves
+
+            :param quiet: if False, stop after captures and promotions
+        """
+        player = self.player
+        oppnt = player^1
+        CAPTURE = move.flags.CAPTURE
+        PROMOTIONS = [piece | player<<3 for piece in
+                      (WHITE_QUEEN, WHITE_KNIGHT, WHITE_ROOK, WHITE_BISHOP)]
+
+        occ = self.positions[OFFSET + ALL]
+        empty = ~occ & bb.masks.FULL
+        friendly = self.positions[OFFSET + player]
+        nfriendly = ~friendly & bb.masks.FULL
+        enemy = self.positions[OFFSET + oppnt]
+
+        king_sq, checkers, pinned = self._check_info()
+        line = bb.LINE[king_sq]
+
+        king_targets = bb.K_ATTACKS[king_sq] & nfriendly
+        no_king = self._king_occupancy(king_sq, checkers)
+
+        def king_moves(targets, flags):
+            for to in bb.get_set_bits(targets):
+                if not self.is_attacked(to, oppnt, no_king):
+                    yield move.new(king_sq, to, flags)
+
+        ### Stage 1: captures and promotions ###
+
+        for m in king_moves(king_targets & enemy, CAPTURE):
+            yield m
+
+        if checkers & (checkers - 1):  # double check: only the king may move
+            if quiet:
+                for m in king_moves(king_targets & empty, 0):
+                    yield m
+            return
+
+        if checkers:  # capture the checker or block the check
+            target = bb.BETWEEN[king_sq][bb.bitscan(checkers)] | checkers
+        else:
+            target = nfriendly
+
+        promotion_rank = bb.masks.RANK_MASK[7*oppnt]
+        pawns = self.positions[WHITE_PAWN | player << 3]
+        pinned_pawns = pawns & pinned
+        spushes = bb.P_spushes[player](pawns, empty)
+
+        for frm in bb.get_set_bits(pawns):
+            mask = target
+            if 1 << frm & pinned_pawns:
+                mask &= line[frm]
+
+            for to in bb.get_set_bits(bb.P_attacks[player](enemy, frm) & mask):
+                if 1 << to & promotion_rank:
+                    for piece in PROMOTIONS:
+                        yield move.new(frm, to, CAPTURE, piece)
+                else:
+                    yield move.new(frm, to, CAPTURE)
+
+            to = frm + 8 - player*16
+            if 1 << frm & spushes and 1 << to & mask & promotion_rank:
+                for piece in PROMOTIONS:
+                    yield move.new(frm, to, 0, piece)
+
+            # en passant can uncover a check along the rank, test it in full
+            if self.ep and bb.P_ATTACKS[player][frm] & (1 << self.ep):
+                m = move.new(frm, self.ep, CAPTURE | move.flags.EP)
+                self.make(m)
+                legal = not self.is_attacked(king_sq, oppnt)
+                self.unmake()
+                if legal:
+                    yield m
+
+        # keep each piece's targets for the quiet stage
+        piece_targets = []
+        for piece in [WHITE_KNIGHT, WHITE_BISHOP, WHITE_ROOK, WHITE_QUEEN]:
+            piece_bb = self.positions[piece | player << 3]
+            for frm in bb.get_set_bits(piece_bb):
+                attacks = bb.pieces.attacks[piece](occ, frm) & target
+                if 1 << frm & pinned:
+                    attacks &= line[frm]
+                for to in bb.get_set_bits(attacks & enemy):
+                    yield move.new(frm, to, CAPTURE)
+                piece_targets.append((frm, attacks & empty))
+
+        if not quiet:
+            return
+
+        ### Stage 2: castling ###
+
+        if not checkers:
+            for m in self._castling_moves(king_sq):
+                yield m
+
+        ### Stage 3: quiet moves ###
+
+        for m in king_moves(king_targets & empty, 0):
+            yield m
+
+        dpushes = bb.P_dpushes[player](pawns, empty)
+        for frm in bb.get_set_bits(spushes & ~bb.masks.RANK_MASK[6 - 5*player]):
+            mask = target
+            if 1 << frm & pinned_pawns:
+                mask &= line[frm]
+
+            to = frm + 8 - player*16
+            if 1 << to & mask:
+                yield move.new(frm, to)
+
+            if 1 << frm & dpushes:
+                to = frm + 16 - player*32
+                if 1 << to & mask:
+                    yield move.new(frm, to, move.flags.DPUSH)
+
+        for frm, targets in piece_targets:
+            for to in bb.get_set_bits(targets):
+                yield move.new(frm, to)
+
+    def count_legal_moves(self):
+        """ Number of legal moves, i.e. `len(self.move_list())`
+
+            Target sets are masked exactly as in `move_list` but counted
+            with popcounts, and unpinned pawns are counted set-wise, so no
+            moves are built. Only en passant captures are made and unmade.
+        """
+        player = self.player
+        oppnt = player^1
+        pos = self.positions
+        popcount = bb.popcount
+
+        occ = pos[OFFSET + ALL]
+        empty = ~occ & bb.masks.FULL
+        nfriendly = ~pos[OFFSET + player] & bb.masks.FULL
+        enemy = pos[OFFSET + oppnt]
+
+        king_sq, checkers, pinned = self._check_info()
+        line = bb.LINE[king_sq]
+
+        targets = bb.K_ATTACKS[king_sq] & nfriendly
+        count = 0
+        no_king = self._king_occupancy(king_sq, checkers)
+        for to in bb.get_set_bits(targets):
+            if not self.is_attacked(to, oppnt, no_king):
+                count += 1
+
+        if checkers & (checkers - 1):  # double check: only the king may move
+            return count
+
+        if checkers:
+            target = bb.BETWEEN[king_sq][bb.bitscan(checkers)] | checkers
+        else:
+            target = nfriendly
+
+        # pawns: promotions count once for each piece
+        promotion = bb.masks.RANK_MASK[7*oppnt]
+        pawns = pos[WHITE_PAWN | player << 3]
+        free = pawns & ~pinned
+        if player == WHITE:
+            single = free << 8 & empty
+            double = (single & bb.masks.RANK_MASK[2]) << 8 & empty
+            captures = free << 7 & ~bb.A8H8, free << 9 & ~bb.A1H1
+        else:
+            single = free >> 8 & empty
+            double = (single & bb.masks.RANK_MASK[5]) >> 8 & empty
+            captures = free >> 9 & ~bb.A8H8, free >> 7 & ~bb.A1H1
+
+        count += popcount(double & target)
+        for to in (single & target, captures[0] & enemy & target,
+                   captures[1] & enemy & target):
+            count += popcount(to & ~promotion) + 4*popcount(to & promotion)
+
+        start = bb.masks.RANK_MASK[1 + 5*player]
+        for frm in bb.get_set_bits(pawns & pinned):
+            to = bb.P_attacks[player](enemy, frm)
+            push = 1 << (frm + 8 - player*16) & empty
+            if push:
+                to |= push
+                if 1 << frm & start:
+                    to |= 1 << (frm + 16 - player*32) & empty
+            to &= target & line[frm]
+            count += popcount(to & ~promotion) + 4*popcount(to & promotion)
+
+        # en passant can uncover a check along the rank, test it in full
+        if self.ep:
+            for frm in bb.get_set_bits(bb.P_ATTACKS[oppnt][self.ep] & pawns):
+                self.make(move.new(frm, self.ep, move.flags.CAPTURE | move.flags.EP))
+                if not self.is_attacked(king_sq, oppnt):
+                    count += 1
+                self.unmake()
+
+        for piece in [WHITE_KNIGHT, WHITE_BISHOP, WHITE_ROOK, WHITE_QUEEN]:
+            for frm in bb.get_set_bits(pos[piece | player << 3]):
+                attacks = bb.pieces.attacks[piece](occ, frm) & target
+                if 1 << frm & pinned:
+                    attacks &= line[frm]
+                count += popcount(attacks)
+
+        if not checkers:
+            count += len(self._castling_moves(king_sq))
+
+        return count
+
+    ### Game status ###
+
+    def in_check(self):
+        """ Is the side to move in check? """
+        return self._check_info()[1] != 0
+
+    def has_legal_move(self):
+        """ Does the side to move have a legal move? Stops at the first one
+            found, usually a capture or a king move
+        """
+        for m in self.generate_moves():
+            return True
+        return False
+
+    def is_checkmate(self):
+        return self.in_check() and not self.has_legal_move()
+
+    def is_stalemate(self):
+        return not self.in_check() and not self.has_legal_move()
+
+    def is_repetition(self, n=3):
+        """ Has the position occurred `n` times, counting this one?
+
+            The key before each move is kept on the undo stack, and only
+            positions since the last capture or pawn move (`half_moves`
+            plies, at most) can repeat, with the same side to move: so
+            only every other key in that window is compared.
+            Positions are compared by zobrist key, which only counts the
+            en passant file when a pawn can capture there.
+        """
+        key = self.hash
+        undo = self.undo
+        plies = len(self.moves)
+        count = 1
+        for ply in xrange(plies - 2, plies - 1 - min(self.half_moves, plies), -2):
+            if undo[ply * UNDO_SIZE + UNDO_HASH] == key:
+                count += 1
+                if count >= n:
+                    return True
+        return False
+
+    def is_fifty_move_draw(self):
+        """ Have fifty moves each passed without a capture or pawn move
+            (unless the last of them mated)?
+        """
+        return self.half_moves >= 100 and not self.is_checkmate()
+
+    def reference_move_list(self):
+        """ Generate pseudo-legal moves and filter them with `is_legal`
+
+            Slow, but simple: kept as a reference for the perft suite.
+            Moves carry no flags, replay them with `makemove`.
+        """
         moves = []
 
         occ = self.positions[OFFSET + ALL]
@@ -396,5 +987,5 @@ class Board(Serializer):
  
         # only return legal moves
         for m in moves:
-            if self.is_legal(*m[:2]):
+            if self.is_legal(move.frm(m), move.to(m), move.promotion(m)):
                 yield m
@@ -0,0 +1,147 @@
+""" Tapered material and piece-square evaluation
+
+    Every (piece, square) pair has a middlegame and an endgame score,
+    material included, and every piece a weight towards the game phase
+    (24 with all minor and major pieces on the board, 0 with none).
+    `Board.pickup` and `Board.drop` keep the white-minus-black sums
+    `board.mg`, `board.eg` and `board.phase` up to date, so `evaluate`
+    only has to blend two integers.
+"""
+
+from constants import *
+
+
+# by piece type: pawn, king, knight, bishop, rook, queen
+MG_VALUES = (82, 0, 337, 365, 477, 1025)
+EG_VALUES = (94, 0, 281, 297, 512, 936)
+PHASE_WEIGHTS = (0, 0, 1, 1, 2, 4)
+MAX_PHASE = 24
+
+# Piece-square tables from white's point of view, laid out as the board is
+# printed: a8 first, h1 last
+
+PAWN_MG = (
+      0,   0,   0,   0,   0,   0,   0,   0,
+     50,  50,  50,  50,  50,  50,  50,  50,
+     10,  10,  20,  30,  30,  20,  10,  10,
+      5,   5,  10,  25,  25,  10,   5,   5,
+      0,   0,   0,  20,  20,   0,   0,   0,
+      5,  -5, -10,   0,   0, -10,  -5,   5,
+      5,  10,  10, -20, -20,  10,  10,   5,
+      0,   0,   0,   0,   0,   0,   0,   0,
+)
+
+PAWN_EG = (
+      0,   0,   0,   0,   0,   0,   0,   0,
+     80,  80,  80,  80,  80,  80,  80,  80,
+     50,  50,  50,  50,  50,  50,  50,  50,
+     30,  30,  30,  30,  30,  30,  30,  30,
+     15,  15,  15,  15,  15,  15,  15,  15,
+      5,   5,   5,   5,   5,   5,   5,   5,
+      0,   0,   0,   0,   0,   0,   0,   0,
+      0,   0,   0,   0,   0,   0,   0,   0,
+)
+
+KNIGHT = (
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20,   0,   0,   0,   0, -20, -40,
+    -30,   0,  10,  15,  15,  10,   0, -30,
+    -30,   5,  15,  20,  20,  15,   5, -30,
+    -30,   0,  15,  20,  20,  15,   0, -30,
+    -30,   5,  10,  15,  15,  10,   5, -30,
+    -40, -20,   0,   5,   5,   0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50,
+)
+
+BISHOP = (
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10,   0,   0,   0,   0,   0,   0, -10,
+    -10,   0,   5,  10,  10,   5,   0, -10,
+    -10,   5,   5,  10,  10,   5,   5, -10,
+    -10,   0,  10,  10,  10,  10,   0, -10,
+    -10,  10,  10,  10,  10,  10,  10, -10,
+    -10,   5,   0,   0,   0,   0,   5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20,
+)
+
+ROOK = (
+      0,   0,   0,   0,   0,   0,   0,   0,
+      5,  10,  10,  10,  10,  10,  10,   5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+     -5,   0,   0,   0,   0,   0,   0,  -5,
+      0,   0,   0,   5,   5,   0,   0,   0,
+)
+
+QUEEN = (
+    -20, -10, -10,  -5,  -5, -10, -10, -20,
+    -10,   0,   0,   0,   0,   0,   0, -10,
+    -10,   0,   5,   5,   5,   5,   0, -10,
+     -5,   0,   5,   5,   5,   5,   0,  -5,
+      0,   0,   5,   5,   5,   5,   0,  -5,
+    -10,   5,   5,   5,   5,   5,   0, -10,
+    -10,   0,   5,   0,   0,   0,   0, -10,
+    -20, -10, -10,  -5,  -5, -10, -10, -20,
+)
+
+KING_MG = (
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+     20,  20,   0,   0,   0,   0,  20,  20,
+     20,  30,  10,   0,   0,  10,  30,  20,
+)
+
+KING_EG = (
+    -50, -40, -30, -20, -20, -30, -40, -50,
+    -30, -20, -10,   0,   0, -10, -20, -30,
+    -30, -10,  20,  30,  30,  20, -10, -30,
+    -30, -10,  30,  40,  40,  30, -10, -30,
+    -30, -10,  30,  40,  40,  30, -10, -30,
+    -30, -10,  20,  30,  30,  20, -10, -30,
+    -30, -30,   0,   0,   0,   0, -30, -30,
+    -50, -30, -30, -30, -30, -30, -30, -50,
+)
+
+# by piece type
+MG_TABLES = (PAWN_MG, KING_MG, KNIGHT, BISHOP, ROOK, QUEEN)
+EG_TABLES = (PAWN_EG, KING_EG, KNIGHT, BISHOP, ROOK, QUEEN)
+
+
+def _scores(values, tables):
+    """ [piece code][square] -> signed score, material included """
+    scores = [[0] * 64 for piece in xrange(14)]
+    for kind in xrange(6):
+        for sq in xrange(64):
+            # a8 comes first in the tables: flip the rank for white
+            scores[kind][sq] = values[kind] + tables[kind][sq ^ 56]
+            scores[kind | 8][sq] = -(values[kind] + tables[kind][sq])
+    return scores
+
+
+MG = _scores(MG_VALUES, MG_TABLES)
+EG = _scores(EG_VALUES, EG_TABLES)
+PHASE = list(PHASE_WEIGHTS) + [0, 0] + list(PHASE_WEIGHTS)
+
+
+def compute(board):
+    """ (mg, eg, phase) for `board` from scratch """
+    mg = eg = phase = 0
+    for sq, piece in enumerate(board.occupancy):
+        if piece != -1:
+            mg += MG[piece][sq]
+            eg += EG[piece][sq]
+            phase += PHASE[piece]
+    return mg, eg, phase
+
+
+def evaluate(board):
+    """ Tapered score from the side to move's point of view """
+    phase = min(board.phase, MAX_PHASE)  # promotions can push it past 24
+    score = (board.mg * phase + board.eg * (MAX_PHASE - phase)) / MAX_PHASE
+    return board.player and -score or score
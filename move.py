@@ -6,5 +6,36 @@ class flags(object):
     EP = 0x10
 
 
-def new(frm, to, cpiece=-1, flags=0x00, cr=0X0F, promotion=None):
-    return (frm, to, cpiece, flags, cr, promotion)
+# Moves are packed into a single int:
+#   bits  0-5   from square
+#   bits  6-11  to square
+#   bits 12-15  promotion piece (0 for none: pawns are never promoted to)
+#   bits 16-20  flags
+TO_SHIFT = 6
+PROMOTION_SHIFT = 12
+FLAGS_SHIFT = 16
+SQ_MASK = 0x3F
+PROMOTION_MASK = 0x0F
+
+
+def new(frm, to, flags=0x00, promotion=None):
+    return frm | to << TO_SHIFT | (promotion or 0) << PROMOTION_SHIFT |\
+        flags << FLAGS_SHIFT
+
+
+def frm(m):
+    return m & SQ_MASK
+
+
+def to(m):
+    return m >> TO_SHIFT & SQ_MASK
+
+
+def promotion(m):
+    return m >> PROMOTION_SHIFT & PROMOTION_MASK or None
+
+
+def unpack(m):
+    """ :returns: (frm, to, flags, promotion) """
+    return (m & SQ_MASK, m >> TO_SHIFT & SQ_MASK, m >> FLAGS_SHIFT,
+            m >> PROMOTION_SHIFT & PROMOTION_MASK or None)
@@ -0,0 +1,255 @@
+""" Portable Game Notation: streaming reader, SAN and parallel replay
+
+    `read_games` parses a PGN file one game at a time, so dumps of any
+    size can be streamed. Moves are resolved from SAN against the legal
+    moves of the position (`parse_san`), and `replay` turns games into
+    per-ply (FEN, zobrist key) records, in a process pool if asked:
+
+    $ python pgn.py games.pgn --workers 0 --out plies.tsv
+"""
+
+import collections
+import itertools
+import multiprocessing
+import re
+import time
+
+from board import Board, InvalidMove, KingInCheck
+from constants import *
+from serialization import san, to_bit
+import move
+
+
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+PIECE_LETTERS = "PKNBRQ"  # by piece type, as in `serialization.PIECES`
+
+TAG_PATT = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+TOKEN_PATT = re.compile(r'\{[^}]*\}?|;.*|\$\d+|[()]|[^\s(){};]+')
+MOVE_NUMBER_PATT = re.compile(r'^\d+\.*')
+SAN_PATT = re.compile(
+    r'^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$')
+
+
+Game = collections.namedtuple("Game", "tags moves result")
+
+
+### Reading ###
+
+def read_games(lines):
+    """ Yield each game in `lines` (e.g. an open PGN file) as a `Game`,
+        holding only the current game in memory. Comments, NAGs and
+        variations are dropped.
+    """
+    tags, movetext = {}, []
+    for line in lines:
+        if line.startswith("%"):  # escaped line
+            continue
+        stripped = line.strip()
+        if stripped.startswith("[") and not _open_comment(movetext):
+            if movetext:
+                yield _game(tags, movetext)
+                tags, movetext = {}, []
+            for key, value in TAG_PATT.findall(stripped):
+                tags[key] = value.replace('\\"', '"').replace("\\\\", "\\")
+        elif stripped:
+            movetext.append(stripped)
+
+    if tags or movetext:
+        yield _game(tags, movetext)
+
+
+def _open_comment(movetext):
+    """ Does the movetext so far end inside a {comment}? """
+    text = "\n".join(movetext)
+    return text.rfind("{") > text.rfind("}")
+
+
+def _game(tags, movetext):
+    moves = []
+    result = tags.get("Result", "*")
+    depth = 0  # of nested variations
+    for token in TOKEN_PATT.findall("\n".join(movetext)):
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+        elif depth or token[0] in "{;$":
+            continue
+        elif token in RESULTS:
+            result = token
+        else:
+            token = MOVE_NUMBER_PATT.sub("", token)
+            if token:
+                moves.append(token)
+    return Game(tags, moves, result)
+
+
+### SAN ###
+
+def parse_san(board, text):
+    """ The packed move for `text`, in Standard Algebraic Notation, in
+        the position on `board`
+        :raises InvalidMove: if no legal move, or more than one, matches
+    """
+    text = text.rstrip("+#!?")
+    if text in ("O-O", "0-0", "O-O-O", "0-0-0"):
+        flag = len(text) == 3 and move.flags.KCASTLE or move.flags.QCASTLE
+        candidates = [m for m in board.move_list()
+                      if m >> move.FLAGS_SHIFT & flag]
+    else:
+        match = SAN_PATT.match(text)
+        if not match:
+            raise InvalidMove("Cannot parse SAN %r" % text)
+        letter, file_, rank, to, promotion = match.groups()
+        piece = PIECE_LETTERS.index(letter or "P")
+        to = to_bit(to)
+        promotion = promotion and PIECE_LETTERS.index(promotion) or None
+
+        candidates = []
+        for m in board.move_list():
+            frm, m_to, flags, m_promotion = move.unpack(m)
+            if m_to != to or board.occupancy[frm] & 7 != piece or \
+                    (m_promotion and m_promotion & 7) != promotion:
+                continue
+            if file_ and "abcdefgh"[frm & 7] != file_ or \
+                    rank and "12345678"[frm >> 3] != rank:
+                continue
+            candidates.append(m)
+
+    if len(candidates) != 1:
+        raise InvalidMove("%s move %r" % (
+            candidates and "Ambiguous" or "Illegal", text))
+    return candidates[0]
+
+
+def to_san(board, m):
+    """ `m`, a legal move on `board`, in Standard Algebraic Notation """
+    frm, to, flags, promotion = move.unpack(m)
+    piece = board.occupancy[frm] & 7
+
+    if flags & move.flags.KCASTLE:
+        text = "O-O"
+    elif flags & move.flags.QCASTLE:
+        text = "O-O-O"
+    elif piece == WHITE_PAWN:
+        text = flags & move.flags.CAPTURE and san(frm)[0] + "x" or ""
+        text += san(to)
+        if promotion:
+            text += "=" + PIECE_LETTERS[promotion & 7]
+    else:
+        # disambiguate from the other pieces of the same type reaching `to`
+        others = [move.frm(o) for o in board.move_list() if move.to(o) == to
+                  and move.frm(o) != frm and board.occupancy[move.frm(o)] & 7 == piece]
+        prefix = ""
+        if others:
+            if all(o & 7 != frm & 7 for o in others):
+                prefix = san(frm)[0]
+            elif all(o >> 3 != frm >> 3 for o in others):
+                prefix = san(frm)[1]
+            else:
+                prefix = san(frm)
+        text = PIECE_LETTERS[piece] + prefix + \
+            (flags & move.flags.CAPTURE and "x" or "") + san(to)
+
+    board.make(m)
+    if board.in_check():
+        text += board.has_legal_move() and "+" or "#"
+    board.unmake()
+    return text
+
+
+### Replay ###
+
+Ply = collections.namedtuple("Ply", "game ply san fen hash")
+
+
+def replay_game(board, index, game):
+    """ (plies, error) for `game`: a `Ply` record after each move, up to
+        the first move that cannot be made
+    """
+    board.reset(game.tags.get("FEN", INITIAL_FEN))
+    plies = []
+    for ply, text in enumerate(game.moves, 1):
+        try:
+            board.make(parse_san(board, text))
+        except (InvalidMove, KingInCheck) as e:
+            return plies, "ply %i: %s" % (ply, e)
+        plies.append(Ply(index, ply, text, repr(board), board.hash))
+    return plies, None
+
+
+def replay(games, workers=1, batch=500):
+    """ Replay `games` and yield (index, plies, error) for each, in order
+
+        With more than one worker, games are handed to a process pool
+        `batch` at a time, so a long stream is never read ahead by more
+        than that.
+    """
+    games = enumerate(games)
+    if workers <= 1:
+        _init_worker()
+        for task in games:
+            yield _replay_task(task)
+        return
+
+    pool = multiprocessing.Pool(workers, _init_worker)
+    try:
+        while True:
+            tasks = list(itertools.islice(games, batch))
+            if not tasks:
+                break
+            for result in pool.imap(_replay_task, tasks, chunksize=16):
+                yield result
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+### Process pool workers ###
+
+_worker = {}
+
+
+def _init_worker():
+    _worker["board"] = Board()
+
+
+def _replay_task(task):
+    index, game = task
+    plies, error = replay_game(_worker["board"], index, game)
+    return index, plies, error
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(prog="pgn", description=
+                                     "replay PGN games into per-ply records")
+    parser.add_argument("path", help="PGN file, - for stdin")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="process pool size (0 = all cpus)")
+    parser.add_argument("-o", "--out", metavar="PATH",
+                        help="write game, ply, SAN, FEN and key as TSV")
+    args = parser.parse_args()
+
+    source = args.path == "-" and sys.stdin or open(args.path, 'rb')
+    out = args.out and open(args.out, 'wb')
+    workers = args.workers or multiprocessing.cpu_count()
+
+    games = plies = errors = 0
+    start = time.time()
+    for index, records, error in replay(read_games(source), workers):
+        games += 1
+        plies += len(records)
+        if error:
+            errors += 1
+            print >>sys.stderr, "game %i: %s" % (index + 1, error)
+        if out:
+            for r in records:
+                out.write("%i\t%i\t%s\t%s\t%016x\n" % r)
+    elapsed = time.time() - start
+
+    print "%i games, %i plies in %.2fs (%.1f games/s, %i plies/s), " \
+        "%i errors" % (games, plies, elapsed, elapsed and games / elapsed,
+                       elapsed and plies / elapsed, errors)
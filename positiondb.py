@@ -0,0 +1,245 @@
+""" On-disk position database, indexed by zobrist key and by material
+
+    A database is a directory of three files:
+
+    records.bin     one RECORD per position, in the order they were added:
+                    the position packed as `serialization.POSITION`, then
+                    the game and ply it occurred at
+    hash.idx        (zobrist key, record) pairs, sorted
+    material.idx    (material signature, record) pairs, sorted
+
+    Index entries are big endian so that they sort bytewise. Lookups
+    memory-map the indexes and binary search them; `append` merges each
+    batch into the indexes in one sequential pass, so add positions in
+    large batches.
+"""
+
+import collections
+import heapq
+import itertools
+import mmap
+import os
+import re
+import struct
+import tempfile
+
+from board import Board, InvalidMove, KingInCheck
+from constants import *
+from serialization import POSITION_SIZE
+import bitboards as bb
+import pgn
+
+
+RECORD = struct.Struct("<%ixIH2x" % POSITION_SIZE)  # position, game, ply
+RECORD_SIZE = RECORD.size
+INDEX = struct.Struct(">QI")                        # key, record
+INDEX_SIZE = INDEX.size
+KEY = struct.Struct(">Q")
+
+# The first bytes of a packed position hold the pieces, side to move and
+# castling rights. The en passant byte after them is left out: the key
+# only counts the square when a pawn can capture there (see `zobrist.py`),
+# so positions that differ in a dead en passant square are the same, and
+# a live one already separates positions by key.
+POSITION_KEY_SIZE = 25
+
+# signature nibbles, from the low bits up, and their letters
+MATERIAL_PIECES = (WHITE_KING, WHITE_QUEEN, WHITE_ROOK, WHITE_BISHOP,
+                   WHITE_KNIGHT, WHITE_PAWN, BLACK_KING, BLACK_QUEEN,
+                   BLACK_ROOK, BLACK_BISHOP, BLACK_KNIGHT, BLACK_PAWN)
+MATERIAL_LETTERS = "KQRBNP"
+
+
+Occurrence = collections.namedtuple("Occurrence", "record game ply")
+
+
+def material(board):
+    """ Material signature of `board`: the popcount of each piece
+        bitboard, a nibble each
+    """
+    positions = board.positions
+    popcount = bb.popcount
+    sig = 0
+    for i, piece in enumerate(MATERIAL_PIECES):
+        sig |= popcount(positions[piece]) << 4*i
+    return sig
+
+
+def parse_material(text):
+    """ Material signature for e.g. "KRPvKR" or "KRP vs KR" (white first) """
+    sides = re.split(r"\s*vs?\.?\s*", text.strip(), flags=re.I)
+    if len(sides) != 2:
+        raise ValueError("Expected white vs black material: %r" % text)
+
+    sig = 0
+    for side, letters in enumerate(sides):
+        for letter in letters.upper():
+            i = MATERIAL_LETTERS.find(letter)
+            if i == -1:
+                raise ValueError("Unknown piece %r in %r" % (letter, text))
+            sig += 1 << 4*(i + 6*side)
+    return sig
+
+
+def swap_colours(sig):
+    return sig >> 24 | (sig & 0xFFFFFF) << 24
+
+
+class Database(object):
+
+    FILES = ("records.bin", "hash.idx", "material.idx")
+
+    def __init__(self, path):
+        self.path = path
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        for name in self.FILES:
+            open(os.path.join(path, name), 'ab').close()
+        self.maps = {}
+        self._map()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return len(self.maps["records.bin"]) / RECORD_SIZE
+
+    def _map(self):
+        self._unmap()
+        for name in self.FILES:
+            with open(os.path.join(self.path, name), 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                # an empty file cannot be mapped
+                self.maps[name] = size and mmap.mmap(
+                    f.fileno(), 0, access=mmap.ACCESS_READ) or ""
+
+    def _unmap(self):
+        for data in self.maps.values():
+            if data:
+                data.close()
+        self.maps = {}
+
+    close = _unmap
+
+    ### Adding positions ###
+
+    def append(self, positions):
+        """ Add (board, game, ply) triples in bulk
+            :returns: the number of positions added
+        """
+        first = len(self)
+        buf = bytearray()
+        hashes, materials = [], []
+        for i, (board, game, ply) in enumerate(positions, first):
+            offset = len(buf)
+            buf.extend(RECORD_SIZE * "\0")
+            RECORD.pack_into(buf, offset, game, ply)
+            board.pack_into(buf, offset)
+            hashes.append((board.hash, i))
+            materials.append((material(board), i))
+
+        if not buf:
+            return 0
+        with open(os.path.join(self.path, "records.bin"), 'ab') as f:
+            f.write(buf)
+        self._merge("hash.idx", sorted(hashes))
+        self._merge("material.idx", sorted(materials))
+        self._map()
+        return len(hashes)
+
+    def append_games(self, games, first_game=0):
+        """ Replay `games` (see `pgn.read_games`) and add every position,
+            numbering games from `first_game`; ply 0 is the start position
+            :returns: the number of positions added
+        """
+        def positions():
+            board = Board()
+            for game_id, game in enumerate(games, first_game):
+                board.reset(game.tags.get("FEN", INITIAL_FEN))
+                yield board, game_id, 0
+                for ply, text in enumerate(game.moves, 1):
+                    try:
+                        board.make(pgn.parse_san(board, text))
+                    except (InvalidMove, KingInCheck):
+                        break
+                    yield board, game_id, ply
+
+        return self.append(positions())
+
+    def _merge(self, name, entries):
+        """ Merge sorted (key, record) `entries` into index `name` """
+        old = self.maps[name]
+        existing = (INDEX.unpack_from(old, i)
+                    for i in xrange(0, len(old), INDEX_SIZE))
+
+        fd, tmp = tempfile.mkstemp(dir=self.path)
+        with os.fdopen(fd, 'wb') as f:
+            merged = heapq.merge(existing, entries)
+            while True:
+                chunk = list(itertools.islice(merged, 4096))
+                if not chunk:
+                    break
+                f.write("".join(INDEX.pack(*e) for e in chunk))
+        os.rename(tmp, os.path.join(self.path, name))
+
+    ### Queries ###
+
+    def _lookup(self, name, key):
+        """ Records filed under `key` in index `name` """
+        data = self.maps[name]
+        lo, hi = 0, len(data) / INDEX_SIZE
+        while lo < hi:
+            mid = (lo + hi) >> 1
+            if KEY.unpack_from(data, mid * INDEX_SIZE)[0] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        records = []
+        for offset in xrange(lo * INDEX_SIZE, len(data), INDEX_SIZE):
+            k, record = INDEX.unpack_from(data, offset)
+            if k != key:
+                break
+            records.append(record)
+        return records
+
+    def occurrence(self, record):
+        game, ply = RECORD.unpack_from(self.maps["records.bin"],
+                                       record * RECORD_SIZE)
+        return Occurrence(record, game, ply)
+
+    def load(self, record, board=None):
+        """ Load position `record` into `board` (a new one by default) """
+        board = board or Board()
+        board.unpack_from(self.maps["records.bin"], record * RECORD_SIZE)
+        return board
+
+    def find(self, board):
+        """ Occurrences of the position on `board`, move counters and
+            uncapturable en passant squares aside
+        """
+        data = self.maps["records.bin"]
+        packed = board.to_bytes()[:POSITION_KEY_SIZE]
+        found = []
+        for record in self._lookup("hash.idx", board.hash):
+            offset = record * RECORD_SIZE
+            # guard against key collisions
+            if data[offset:offset + POSITION_KEY_SIZE] == packed:
+                found.append(self.occurrence(record))
+        return found
+
+    def with_material(self, sig, either_colour=False):
+        """ Occurrences of positions with material `sig` (a signature or
+            a string for `parse_material`), by default with white holding
+            the first side's pieces
+        """
+        if isinstance(sig, basestring):
+            sig = parse_material(sig)
+        records = self._lookup("material.idx", sig)
+        if either_colour and swap_colours(sig) != sig:
+            records = sorted(records + self._lookup("material.idx",
+                                                    swap_colours(sig)))
+        return [self.occurrence(r) for r in records]
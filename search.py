@@ -0,0 +1,287 @@
+""" Alpha-beta search
+
+    Negamax with alpha-beta pruning, driven by iterative deepening and a
+    transposition table (`transposition.SearchTable`), with a quiescence
+    search over captures and promotions at the horizon. Moves are tried
+    in order: the table's move, captures by MVV-LVA (most valuable
+    victim, least valuable attacker), killer moves, quiet moves by
+    history score, then captures that lose material by static exchange
+    evaluation (`Board.see`), which quiescence search skips altogether.
+
+    $ pypy search.py "<fen>" --depth 6 --seconds 10
+"""
+
+import collections
+import time
+
+from board import Board
+from constants import *
+from evaluation import evaluate
+from serialization import san
+from transposition import SearchTable, EXACT, LOWER, UPPER
+import move
+
+
+INFINITY = 1000000
+MATE = 100000           # scores beyond MATE - MAX_PLY are mates
+MAX_PLY = 128
+
+# by piece type, for move ordering: pawn, king, knight, bishop, rook, queen
+VALUES = (100, 0, 320, 330, 500, 900)
+
+TT_MOVE = 1 << 30
+CAPTURE = 1 << 20       # + MVV-LVA
+KILLER = 1 << 19        # + killer slot
+BAD_CAPTURE = -CAPTURE  # + MVV-LVA, after all quiet moves
+CHECK_NODES = 1023      # test limits every CHECK_NODES + 1 nodes
+
+
+Result = collections.namedtuple(
+    "Result", "move score depth nodes seconds nps pv")
+
+
+class Timeout(Exception):
+    pass
+
+
+def uci(m):
+    """ Packed move `m` in UCI form, e.g. e7e8q """
+    frm, to, flags, promotion = move.unpack(m)
+    return san(frm) + san(to) + (promotion and "pknbrq"[promotion & 7] or "")
+
+
+class Search(object):
+    """ Searches the position on `board`, which is restored after each
+        search; the table, killers and history carry over between searches
+    """
+
+    def __init__(self, board, table=None, evaluate=evaluate):
+        self.board = board
+        self.table = table or SearchTable()
+        self.evaluate = evaluate
+        self.history = [[0] * 4096, [0] * 4096]  # by side, from * 64 + to
+        self.killers = [[0, 0] for ply in xrange(MAX_PLY)]
+        self.nodes = 0
+
+    def search(self, depth=MAX_PLY, nodes=None, seconds=None, callback=None):
+        """ Search to `depth` plies, or until `nodes` nodes or `seconds` are
+            spent, and return the `Result` of the last completed iteration
+
+            :param callback: called with the `Result` of each iteration
+        """
+        self.nodes = 0
+        self.node_limit = nodes
+        self.deadline = seconds and time.time() + seconds
+        start = time.time()
+        plies = len(self.board.moves)
+
+        result = None
+        for d in xrange(1, min(depth, MAX_PLY - 1) + 1):
+            try:
+                score = self._negamax(d, -INFINITY, INFINITY, 0)
+            except Timeout:
+                while len(self.board.moves) > plies:
+                    self.board.unmake()
+                break
+
+            elapsed = time.time() - start
+            pv = self.pv(d)
+            result = Result(pv and pv[0] or 0, score, d, self.nodes, elapsed,
+                            elapsed and int(self.nodes / elapsed) or 0, pv)
+            if callback:
+                callback(result)
+            if abs(score) > MATE - MAX_PLY:
+                break  # a mate was found, deeper iterations cannot improve it
+
+        if result is None:  # not even depth 1 completed: any legal move
+            moves = self.board.move_list()
+            elapsed = time.time() - start
+            result = Result(moves and moves[0] or 0, 0, 0, self.nodes, elapsed,
+                            elapsed and int(self.nodes / elapsed) or 0,
+                            moves[:1])
+        return result
+
+    def pv(self, depth):
+        """ The principal variation, followed through the table """
+        board = self.board
+        line = []
+        while len(line) < depth:
+            entry = self.table.probe(board.hash)
+            if not entry or entry[3] not in board.move_list():
+                break
+            line.append(entry[3])
+            board.make(entry[3])
+        for m in line:
+            board.unmake()
+        return line
+
+    def _tick(self):
+        self.nodes += 1
+        if not self.nodes & CHECK_NODES:
+            if self.node_limit and self.nodes >= self.node_limit or \
+                    self.deadline and time.time() >= self.deadline:
+                raise Timeout()
+
+    def _order(self, moves, tt_move, ply):
+        """ (score, move) pairs for `moves`, best first; captures that
+            lose material score below zero
+        """
+        occupancy = self.board.occupancy
+        history = self.history[self.board.player]
+        killers = self.killers[ply]
+
+        def score(m):
+            if m == tt_move:
+                return TT_MOVE
+            frm = m & move.SQ_MASK
+            to = m >> move.TO_SHIFT & move.SQ_MASK
+            flags = m >> move.FLAGS_SHIFT
+            promotion = m >> move.PROMOTION_SHIFT & move.PROMOTION_MASK
+            if flags & move.flags.CAPTURE or promotion:
+                gain = promotion and VALUES[promotion & 7]
+                if flags & move.flags.EP:
+                    gain += VALUES[WHITE_PAWN]
+                elif flags & move.flags.CAPTURE:
+                    gain += VALUES[occupancy[to] & 7]
+                mvv_lva = 10 * gain - VALUES[occupancy[frm] & 7] / 10
+                if self._losing(m):
+                    return BAD_CAPTURE + mvv_lva
+                return CAPTURE + mvv_lva
+            if m == killers[0]:
+                return KILLER + 1
+            if m == killers[1]:
+                return KILLER
+            return history[frm << 6 | to]
+
+        scored = [(score(m), m) for m in moves]
+        scored.sort(reverse=True)
+        return scored
+
+    def _losing(self, m):
+        """ Does capture `m` lose material? Only captures of a less
+            valuable piece need an exchange evaluation
+        """
+        if m >> move.FLAGS_SHIFT & move.flags.EP or \
+                m >> move.PROMOTION_SHIFT & move.PROMOTION_MASK:
+            return False
+        occupancy = self.board.occupancy
+        victim = occupancy[m >> move.TO_SHIFT & move.SQ_MASK]
+        return VALUES[victim & 7] < VALUES[occupancy[m & move.SQ_MASK] & 7] \
+            and self.board.see(m) < 0
+
+    def _negamax(self, depth, alpha, beta, ply):
+        if depth <= 0:
+            return self._quiesce(alpha, beta, ply)
+
+        board = self.board
+        self._tick()
+        if ply and (board.half_moves >= 100 or board.is_repetition(2)):
+            return 0
+
+        key = board.hash
+        tt_move = 0
+        entry = self.table.probe(key)
+        if entry:
+            t_depth, t_score, bound, tt_move = entry
+            if ply and t_depth >= depth:
+                t_score = _from_table(t_score, ply)
+                if bound == EXACT or \
+                        bound == LOWER and t_score >= beta or \
+                        bound == UPPER and t_score <= alpha:
+                    return t_score
+
+        moves = board.move_list()
+        if not moves:
+            return board.in_check() and ply - MATE or 0
+
+        alpha_orig = alpha
+        best, best_move = -INFINITY, 0
+        for order, m in self._order(moves, tt_move, ply):
+            board.make(m)
+            score = -self._negamax(depth - 1, -beta, -alpha, ply + 1)
+            board.unmake()
+
+            if score > best:
+                best, best_move = score, m
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        if not m >> move.FLAGS_SHIFT & move.flags.CAPTURE:
+                            self._cutoff(m, depth, ply)
+                        break
+
+        bound = best <= alpha_orig and UPPER or best >= beta and LOWER or EXACT
+        self.table.store(key, depth, _to_table(best, ply), bound, best_move)
+        return best
+
+    def _cutoff(self, m, depth, ply):
+        """ Remember quiet move `m`, which caused a beta cutoff """
+        killers = self.killers[ply]
+        if killers[0] != m:
+            killers[1], killers[0] = killers[0], m
+        history = self.history[self.board.player]
+        i = (m & move.SQ_MASK) << 6 | m >> move.TO_SHIFT & move.SQ_MASK
+        history[i] += depth * depth
+
+    def _quiesce(self, alpha, beta, ply):
+        """ Search captures and promotions until the position is quiet """
+        board = self.board
+        self._tick()
+        stand_pat = self.evaluate(board)
+        if stand_pat >= beta or ply >= MAX_PLY - 1:
+            return stand_pat
+        alpha = max(alpha, stand_pat)
+
+        moves = list(board.generate_moves(quiet=False))
+        for order, m in self._order(moves, 0, ply):
+            if order < 0:
+                break  # only losing captures are left
+            board.make(m)
+            score = -self._quiesce(-beta, -alpha, ply + 1)
+            board.unmake()
+
+            if score > alpha:
+                alpha = score
+                if alpha >= beta:
+                    break
+        return alpha
+
+
+def _to_table(score, ply):
+    """ Mate scores are stored relative to the node, not the root """
+    if score > MATE - MAX_PLY:
+        return score + ply
+    if score < MAX_PLY - MATE:
+        return score - ply
+    return score
+
+
+def _from_table(score, ply):
+    if score > MATE - MAX_PLY:
+        return score - ply
+    if score < MAX_PLY - MATE:
+        return score + ply
+    return score
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="search", description=
+                                     "search a position")
+    parser.add_argument("fen", nargs="?", default=INITIAL_FEN)
+    parser.add_argument("-d", "--depth", type=int, default=MAX_PLY)
+    parser.add_argument("-n", "--nodes", type=int)
+    parser.add_argument("-s", "--seconds", type=float, default=5)
+    parser.add_argument("--hash", type=float, default=16, metavar="MB",
+                        help="transposition table size")
+    args = parser.parse_args()
+
+    def report(r):
+        print "depth %2i score %6i nodes %9i %8.2fs %7i nps  pv %s" % (
+            r.depth, r.score, r.nodes, r.seconds, r.nps,
+            " ".join(uci(m) for m in r.pv))
+
+    search = Search(Board(args.fen), SearchTable(args.hash))
+    result = search.search(args.depth, args.nodes, args.seconds, report)
+    print "bestmove %s" % (result.move and uci(result.move) or "(none)")
@@ -1,6 +1,9 @@
 import operator
+import struct
+
 from bitboards.twiddling import *
 from constants import *
+import bitboards as bb
 
 
 EMPTY = "-"
@@ -9,6 +12,16 @@ UPIECES = (u'\u2659\u2654\u2658\u2657\u2656\u2655-'
            u'-\u265F\u265A\u265E\u265D\u265C\u265B')
 OFFSET = len(PIECES)
 
+# Binary positions, 32 bytes each, little endian:
+#   Q   occupancy bitboard
+#   QQ  a piece code nibble for each occupied square, in square order
+#   B   side to move | castling rights << 1
+#   B   en passant square, or 0
+#   H   half moves
+#   H   full moves
+POSITION = struct.Struct("<QQQBBHH2x")
+POSITION_SIZE = POSITION.size
+
 
 def to_bit(san):
     f, r = san
@@ -21,6 +34,8 @@ def san(sq):
 
 class Serializer(object):
 
+    __slots__ = ()
+
     def __init__(self, fen=INITIAL_FEN):
         self.setboard(fen)
 
@@ -110,3 +125,70 @@ class Serializer(object):
         self.ep = ep != EMPTY and to_bit(ep) or None
         self.half_moves = int(hm)
         self.full_moves = int(fm)
+
+    def pack_into(self, buf, offset=0):
+        """ Write the position into `buf` (a bytearray, writable memoryview
+            ...) at `offset`, as POSITION_SIZE bytes
+        """
+        occ = self.positions[-1]
+        nibbles = 0L
+        for i, sq in enumerate(bb.get_set_bits(occ)):
+            nibbles |= self.occupancy[sq] << 4*i
+        if nibbles >> 128:
+            raise ValueError("Cannot pack more than 32 pieces")
+
+        POSITION.pack_into(buf, offset, occ, nibbles & 0xFFFFFFFFFFFFFFFFL,
+                           nibbles >> 64, self.player | self.castling << 1,
+                           self.ep or 0, self.half_moves, self.full_moves)
+
+    def to_bytes(self):
+        buf = bytearray(POSITION_SIZE)
+        self.pack_into(buf)
+        return str(buf)
+
+    def setbytes(self, buf, offset=0):
+        """ Load a position written by `pack_into` onto an empty board """
+        occ, low, high, state, ep, self.half_moves, self.full_moves = \
+            POSITION.unpack_from(buf, offset)
+        nibbles = low | high << 64
+
+        positions = self.positions
+        occupancy = self.occupancy
+        for sq in bb.get_set_bits(occ):
+            piece = nibbles & 0xF
+            nibbles >>= 4
+            occupancy[sq] = piece
+            positions[piece] |= 1<<sq
+            positions[OFFSET + (piece>>3)] |= 1<<sq
+            if piece & 7 == WHITE_KING:
+                self.king[piece>>3] = sq
+        positions[-1] = occ
+
+        self.player = state & 1
+        self.castling = state >> 1
+        self.ep = ep or None
+
+
+def pack(boards, buf=None, offset=0):
+    """ Write `boards` one after another into `buf`, by default a new
+        bytearray of the right size, and return it
+    """
+    if buf is None:
+        buf = bytearray(POSITION_SIZE * len(boards))
+    for board in boards:
+        board.pack_into(buf, offset)
+        offset += POSITION_SIZE
+    return buf
+
+
+def unpack(buf, board, offset=0, count=None):
+    """ Yield `board` loaded with each position packed in `buf` in turn
+
+        The same board is reused for every position, so copy it to keep
+        one beyond the next iteration.
+    """
+    end = len(buf) if count is None else offset + count * POSITION_SIZE
+    while offset + POSITION_SIZE <= end:
+        board.unpack_from(buf, offset)
+        yield board
+        offset += POSITION_SIZE
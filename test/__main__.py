@@ -1,37 +1,80 @@
+import argparse
+import multiprocessing
 import sys
-import csv
+import time
 
-from debug import Debugger
-from board import Board
+import bitboards
+import suite
 
-if len(sys.argv) > 1:
-    depth = int(sys.argv[1])
-    assert 0 < depth < 7
 
+def parse_range(spec):
+    """ "1-3,5" -> [1, 2, 3, 5] """
+    values = []
+    for part in spec.split(','):
+        lo, _, hi = part.partition('-')
+        values.extend(xrange(int(lo), int(hi or lo) + 1))
+    return values
 
-board = Board()
-debugger = Debugger(board, quiet=True)
 
+parser = argparse.ArgumentParser(prog="test", description="perft suite")
+parser.add_argument("depth", type=parse_range,
+                    help="ply (or range of plies) to test, e.g. 4 or 1-6")
+parser.add_argument("-p", "--positions", type=parse_range, default=None,
+                    help="suite line numbers to run, e.g. 1-10,25")
+parser.add_argument("-w", "--workers", type=int, default=1,
+                    help="process pool size (0 = all cpus)")
+parser.add_argument("--hash", type=float, default=None, metavar="MB",
+                    help="perft transposition table size per worker")
+parser.add_argument("--check-hash", action="store_true",
+                    help="cross-check incremental zobrist keys at each node")
+parser.add_argument("--reference", action="store_true",
+                    help="use the slower make / unmake filtered move generator")
+parser.add_argument("--sliders", choices=("magic", "rotated"),
+                    help="slider attack backend (default: magic)")
+parser.add_argument("--kernel", choices=("parallel", "bit_length", "table"),
+                    help="bit twiddling kernel (default: fastest here)")
+parser.add_argument("--track-attacks", action="store_true",
+                    help="keep attacker sets incrementally in make / unmake")
+parser.add_argument("--json", metavar="PATH", help="write results as JSON")
+parser.add_argument("--csv", metavar="PATH", help="write results as CSV")
+args = parser.parse_args()
 
-def parse_perftsuite():
-    with open('test/perftsuite.epd', 'rb') as csvfile:
-        reader = csv.reader(csvfile, delimiter=';')
-        for row in reader:
-            parsed = [c.strip() for c in row]
-            fen, results = parsed[0], [r.split() for r in parsed[1:]]
-            yield fen, {k: int(v) for k, v in results}
+assert all(0 < d < 7 for d in args.depth)
+workers = args.workers or multiprocessing.cpu_count()
 
 
-l = 0
-for fen, results in parse_perftsuite():
-    l += 1
-    board.reset(fen)
-    if not 'D%i' % depth in results: continue
-    try:
-        assert debugger.divide(depth) == results['D%i' % depth]
-    except AssertionError as e:
+def report(result):
+    if not result["ok"]:
         print "Error\n====="
-        print l, fen
-        import pdb; pdb.set_trace()
+        print "%(line)i %(fen)s" % result
+        print "D%(depth)i: expected %(expected)i, got %(nodes)i" % result
+    else:
+        print "%(line)4i D%(depth)i %(nodes)12i %(seconds)10.3fs " \
+            "%(nps)9i nps" % result
 
-print "OK"
\ No newline at end of file
+
+tasks = suite.tasks(args.positions, args.depth)
+start = time.time()
+results = suite.run(tasks, workers=workers, table_mb=args.hash,
+                    check_hash=args.check_hash, reference=args.reference,
+                    sliders=args.sliders, kernel=args.kernel,
+                    track_attacks=args.track_attacks, callback=report)
+elapsed = time.time() - start
+
+if args.json:
+    suite.write_json(results, args.json)
+if args.csv:
+    suite.write_csv(results, args.csv)
+
+nodes = sum(r["nodes"] for r in results)
+failures = [r for r in results if not r["ok"]]
+print "\n%i positions, %i nodes in %.2fs (%i nps)" % (
+    len(results), nodes, elapsed, elapsed and nodes / elapsed or 0)
+print "bitboards imported in %.1fms, %s kernel" % (
+    bitboards.LOAD_TIME * 1000, args.kernel or bitboards.KERNEL)
+
+if failures:
+    print "FAILED: %i mismatches" % len(failures)
+    sys.exit(1)
+
+print "OK"
@@ -0,0 +1,37 @@
+""" Check the incrementally tracked attacker sets against a full
+    recomputation after every move and take-back of random games from the
+    suite positions
+
+    $ pypy test/attacks.py [plies]
+"""
+
+import sys
+
+import fixtures
+
+
+def check(board):
+    occ = board.positions[-1]
+    return all(board.attackers[sq] == board.attackers_to(sq, occ)
+               for sq in xrange(64))
+
+
+if __name__ == "__main__":
+    plies = len(sys.argv) > 1 and int(sys.argv[1]) or 40
+    errors = checked = 0
+
+    for board in fixtures.positions(plies, track_attacks=True):
+        checked += 1
+        if not check(board):
+            print "mismatch after make: %r" % board
+            errors += 1
+        if board.moves:
+            board.unmake()
+            checked += 1
+            if not check(board):
+                print "mismatch after unmake: %r" % board
+                errors += 1
+
+    print "%i positions checked" % checked
+    print errors and "FAILED: %i mismatches" % errors or "OK"
+    sys.exit(errors and 1 or 0)
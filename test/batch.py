@@ -0,0 +1,100 @@
+""" Parity test: batch NumPy attacks / move counts against `bitboards`
+
+    $ python test/batch.py
+"""
+
+import sys
+
+import numpy as np
+
+from board import OFFSET
+from bitboards import batch
+from constants import *
+import bitboards as bb
+import fixtures
+
+
+def scalar_attacked(board, side):
+    pos = board.positions
+    occ = pos[-1]
+    attacked = 0L
+    for piece in xrange(side << 3, (side << 3) + 6):
+        for sq in bb.get_set_bits(pos[piece]):
+            if piece & 7 == WHITE_PAWN:
+                attacked |= bb.P_ATTACKS[side][sq]
+            else:
+                attacked |= bb.attacks[piece & 7](occ, sq)
+    return attacked
+
+
+def scalar_move_count(board, side):
+    pos = board.positions
+    occ = pos[-1]
+    empty = ~occ & bb.FULL
+    nfriendly = ~pos[OFFSET + side] & bb.FULL
+    enemy = pos[OFFSET + (side ^ 1)]
+    last = bb.RANK_MASK[7 * (side ^ 1)]
+
+    count = 0
+    pawns = pos[WHITE_PAWN | side << 3]
+    spushes = bb.P_spushes[side](pawns, empty)
+    dpushes = bb.P_dpushes[side](pawns, empty)
+    for frm in bb.get_set_bits(pawns):
+        targets = bb.P_attacks[side](enemy, frm)
+        if 1 << frm & spushes:
+            targets |= 1 << (frm + 8 - side * 16)
+        count += len(bb.get_set_bits(targets & ~last))
+        count += 4 * len(bb.get_set_bits(targets & last))
+        count += 1 << frm & dpushes and 1 or 0
+
+    for piece in (WHITE_KING, WHITE_KNIGHT, WHITE_BISHOP, WHITE_ROOK,
+                  WHITE_QUEEN):
+        for sq in bb.get_set_bits(pos[piece | side << 3]):
+            count += len(bb.get_set_bits(bb.attacks[piece](occ, sq) & nfriendly))
+    return count
+
+
+def check(boards):
+    errors = 0
+    pos = batch.from_boards(boards)
+    sides = np.array([b.player for b in boards])
+    counts = batch.move_counts(pos, sides)
+
+    for side in (WHITE, BLACK):
+        maps = batch.attacked(pos, side)
+        sets = dict((piece, batch.attack_sets(pos, piece | side << 3))
+                    for piece in xrange(6))
+
+        for i, board in enumerate(boards):
+            if long(maps[i]) != scalar_attacked(board, side):
+                print "attacked mismatch: side %i %r" % (side, board)
+                errors += 1
+
+            occ = board.positions[-1]
+            for piece, attacks in sets.iteritems():
+                for sq in xrange(64):
+                    if board.occupancy[sq] != piece | side << 3:
+                        expected = 0
+                    elif piece == WHITE_PAWN:
+                        expected = bb.P_ATTACKS[side][sq]
+                    else:
+                        expected = bb.attacks[piece](occ, sq)
+                    if long(attacks[i, sq]) != expected:
+                        print "attack set mismatch: piece %i sq %i %r" % (
+                            piece | side << 3, sq, board)
+                        errors += 1
+
+    for i, board in enumerate(boards):
+        if counts[i] != scalar_move_count(board, board.player):
+            print "move count mismatch: %i != %i %r" % (
+                counts[i], scalar_move_count(board, board.player), board)
+            errors += 1
+    return errors
+
+
+if __name__ == "__main__":
+    boards = fixtures.positions()
+    errors = check(boards)
+    print "%i positions" % len(boards)
+    print errors and "FAILED: %i mismatches" % errors or "OK"
+    sys.exit(errors and 1 or 0)
@@ -0,0 +1,63 @@
+""" Build a polyglot book from random games, then look every move up
+
+    $ pypy test/book.py
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from board import Board
+import fixtures
+import move
+import pgn
+import polyglot
+
+
+# known keys from the polyglot book format documentation
+KEYS = (
+    ("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1", 0x463b96181691fc9c),
+    ("rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq e3 0 1", 0x823c9b50fd114196),
+    ("rnbqkbnr/ppp1pppp/8/3p4/4P3/8/PPPP1PPP/RNBQKBNR w KQkq d6 0 2", 0x0756b94461c50fb0),
+    ("rnbqkbnr/ppp1pppp/8/3pP3/8/8/PPPP1PPP/RNBQKBNR b KQkq - 0 2", 0x662fafb965db29d4),
+    ("rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3", 0x22a48b5a8e47ff78),
+    ("rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPPKPPP/RNBQ1BNR b kq - 0 3", 0x652a607ca3f242c1),
+    ("rnbq1bnr/ppp1pkpp/8/3pPp2/8/8/PPPPKPPP/RNBQ1BNR w - - 0 4", 0x00fdd303c946bdd9),
+    ("rnbqkbnr/p1pppppp/8/8/PpP4P/8/1P1PPPP1/RNBQKBNR b KQkq c3 0 3", 0x3c8123ea7b067637),
+    ("rnbqkbnr/p1pppppp/8/8/P6P/R1p5/1P1PPPP1/1NBQKBNR b Kkq - 0 4", 0x5c3f9b829b279560),
+)
+
+
+if __name__ == "__main__":
+    errors = 0
+    for fen, expected in KEYS:
+        if polyglot.key(Board(fen)) != expected:
+            print "key mismatch: %s" % fen
+            errors += 1
+
+    games, played = fixtures.random_openings(200)
+    fd, path = tempfile.mkstemp(suffix=".bin")
+    os.close(fd)
+    try:
+        size = polyglot.write(path, games)
+        with polyglot.Book(path) as book:
+            start = time.time()
+            for board, m in played:
+                frm, to, flags, promotion = move.unpack(m)
+                entries = book.entries(board)
+                if (frm, to, promotion) not in [e[:3] for e in entries]:
+                    print "missing from book: %s %r" % (
+                        pgn.to_san(board, m), board)
+                    errors += 1
+                for e in entries:  # every book move is legal here
+                    board.makemove(e.frm, e.to, e.promotion)
+                    board.unmake()
+            elapsed = time.time() - start
+    finally:
+        os.remove(path)
+
+    print "%i entries, %i lookups in %.2fs (%.1fus each)" % (
+        size, len(played), elapsed, elapsed / len(played) * 1e6)
+    print errors and "FAILED: %i errors" % errors or "OK"
+    sys.exit(errors and 1 or 0)
@@ -0,0 +1,91 @@
+""" Fill a position database from random games and query it
+
+    $ pypy test/database.py [games]
+"""
+
+import collections
+import shutil
+import sys
+import tempfile
+import time
+
+from board import Board
+import fixtures
+import pgn
+import positiondb
+import zobrist
+
+
+def position(board):
+    """ FEN without the move counters, and with the en passant square
+        only if a pawn can capture there
+    """
+    fields = repr(board).split()[:4]
+    if board.ep and not zobrist.ep_key(board.ep, board.player,
+                                       board.positions):
+        fields[3] = "-"
+    return " ".join(fields)
+
+
+if __name__ == "__main__":
+    n = len(sys.argv) > 1 and int(sys.argv[1]) or 100
+    text, expected = fixtures.random_pgn(n)
+    games = list(pgn.read_games(text.splitlines()))
+    # 1. e4 transposes into the position after 3. Ng1, where no en
+    # passant capture was ever possible
+    games.append(pgn.Game({}, "e4 Nf6 Nf3 Ng8 Ng1".split(), "*"))
+    n += 1
+
+    path = tempfile.mkdtemp()
+    errors = 0
+    try:
+        with positiondb.Database(path) as db:
+            start = time.time()
+            half = n / 2  # two batches, so the second is merged into the first
+            added = db.append_games(games[:half])
+            added += db.append_games(games[half:], first_game=half)
+            elapsed = time.time() - start
+            print "%i positions added in %.2fs (%i/s)" % (
+                added, elapsed, added / elapsed)
+
+            # every record is found again by its position and its material
+            by_fen = collections.defaultdict(set)
+            board = None
+            start = time.time()
+            for record in xrange(len(db)):
+                board = db.load(record, board)
+                occurrence = db.occurrence(record)
+                by_fen[position(board)].add(occurrence)
+                if occurrence not in db.find(board) or occurrence not in \
+                        db.with_material(positiondb.material(board)):
+                    print "record %i not found: %r" % (record, board)
+                    errors += 1
+            elapsed = time.time() - start
+            print "%i lookups in %.2fs (%.1fus each)" % (
+                2 * len(db), elapsed, elapsed / len(db) / 2 * 1e6)
+
+            for fen, occurrences in by_fen.items():
+                board = db.load(min(occurrences).record, board)
+                if set(db.find(board)) != occurrences:
+                    print "occurrences differ: %s" % fen
+                    errors += 1
+
+            # 1. e4 and 3. Ng1 are found from either side
+            for plies in (1, 5):
+                board = Board()
+                for text in games[-1].moves[:plies]:
+                    board.make(pgn.parse_san(board, text))
+                found = set((o.game, o.ply) for o in db.find(board))
+                if not set([(n - 1, 1), (n - 1, 5)]) <= found:
+                    print "transposition not found after ply %i" % plies
+                    errors += 1
+
+            start = positiondb.parse_material("KQRRBBNNPPPPPPPP v KQRRBBNNPPPPPPPP")
+            if len(db.with_material(start)) < n:
+                print "start position material not found"
+                errors += 1
+    finally:
+        shutil.rmtree(path)
+
+    print errors and "FAILED: %i errors" % errors or "OK"
+    sys.exit(errors and 1 or 0)
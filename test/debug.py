@@ -1,36 +1,90 @@
+import multiprocessing
+
+from board import Board
 from serialization import san, to_bit
+from transposition import PerftTable
+import move
+import zobrist
 
 
 class Debugger(object):
 
-    def __init__(self, board, quiet=False):
+    def __init__(self, board, quiet=False, check_hash=False, table=None,
+                 reference=False):
         self.board = board
         self.quiet = quiet
+        self.check_hash = check_hash  # cross-check incremental zobrist keys
+        self.table = table  # optional `transposition.PerftTable`
+        self.reference = reference  # use the make / unmake filtered generator
+
+    def move_list(self):
+        if self.reference:
+            return self.board.reference_move_list()
+        return self.board.move_list()
+
+    def make(self, m):
+        if self.reference:  # reference moves carry no flags: validate them
+            frm, to, flags, promotion = move.unpack(m)
+            self.board.makemove(frm, to, promotion=promotion)
+        else:
+            self.board.make(m)
 
     def perft(self, depth=3):
+        if self.check_hash:
+            assert self.board.hash == zobrist.compute(self.board), \
+                "Hash mismatch: %r" % self.board
+
         if depth == 0:
             return 1
 
-        moves = self.board.move_list()
+        table = self.table
+        if table:
+            key = self.board.hash
+            nodes = table.probe(key, depth)
+            if nodes is not None:
+                return nodes
+
         if depth == 1:
-            return len(list(moves))
+            if self.reference:
+                nodes = len(list(self.move_list()))
+            else:
+                nodes = self.board.count_legal_moves()
+        else:
+            nodes = 0
+            for m in self.move_list():
+                self.make(m)
+                nodes += self.perft(depth - 1)
+                self.board.unmake()
 
-        nodes = 0
-        for frm, to, cpiece, flags, cr, promotion in moves:
-            self.board.makemove(frm, to, promotion=promotion)
-            nodes += self.perft(depth - 1)
-            self.board.unmakemove()
+        if table:
+            table.store(key, depth, nodes)
         return nodes
 
-    def divide(self, depth=3):
+    def divide(self, depth=3, workers=1, split=1):
+        """ perft for each root move
+
+            :param workers: size of the process pool; 1 runs in-process
+            :param split: ply at which the tree is cut into pool tasks.
+                          Splitting at ply 2 gives many smaller tasks,
+                          which balances better across workers.
+        """
+        moves = list(self.move_list())
+        if workers > 1:
+            results, table_stats = self._divide_parallel(moves, depth,
+                                                         workers, split)
+        else:
+            results = []
+            for m in moves:
+                self.make(m)
+                results.append(self.perft(depth - 1))
+                self.board.unmake()
+            table_stats = self.table and self.table.stats()
+
         nodes = 0
-        moves = list(self.board.move_list())
-        for frm, to, cpiece, flags, cr, promotion in moves:
-            self.board.makemove(frm, to, promotion=promotion)
-            result = self.perft(depth - 1)
+        for m, result in zip(moves, results):
             nodes += result
-            self.board.unmakemove()
             if not self.quiet:
+                frm, to, flags, promotion = move.unpack(m)
                 p = promotion and "--nbrq"[promotion % 8] or ""
                 print "%s%s%s: %i" % (san(frm), san(to), p, result)
 
@@ -38,4 +92,74 @@ class Debugger(object):
             print "\n============"
             print "Moves: %i" % len(moves)
             print "Nodes: %i" % nodes
+            if table_stats:
+                print "Table: %(hits)i hits, %(misses)i misses, " \
+                    "%(collisions)i collisions" % table_stats
         return nodes
+
+    def _divide_parallel(self, moves, depth, workers, split):
+        """ (results, table counters) for `moves`; each worker probes a
+            table of its own, and their counters are summed
+        """
+        fen = repr(self.board)
+        tasks = []  # (fen, path, depth)
+        owners = []  # index of the root move each task belongs to
+
+        for i, m in enumerate(moves):
+            if split < 2 or depth < 3:
+                tasks.append((fen, [m], depth - 1))
+                owners.append(i)
+                continue
+
+            self.make(m)
+            for reply in self.move_list():
+                tasks.append((fen, [m, reply], depth - 2))
+                owners.append(i)
+            self.board.unmake()
+
+        table = self.table and (self.table.mb, self.table.policy)
+        pool = multiprocessing.Pool(workers, _init_worker,
+                                    (table, self.reference))
+        try:
+            counts = pool.map(_perft_task, tasks, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+
+        results = [0] * len(moves)
+        table_stats = table and dict.fromkeys(TABLE_COUNTERS, 0)
+        for i, (count, probes) in zip(owners, counts):
+            results[i] += count
+            for name, n in zip(TABLE_COUNTERS, probes or ()):
+                table_stats[name] += n
+        return results, table_stats
+
+
+### Process pool workers ###
+
+_worker = {}  # per-process board and debugger
+
+TABLE_COUNTERS = ("hits", "misses", "collisions")
+
+
+def _init_worker(table=None, reference=False):
+    table = table and PerftTable(*table)
+    _worker["debugger"] = Debugger(Board(), quiet=True, table=table,
+                                   reference=reference)
+
+
+def _perft_task(task):
+    """ Rebuild the board from FEN, play `path` and count nodes below it """
+    fen, path, depth = task
+    debugger = _worker["debugger"]
+    debugger.board.reset(fen)
+    for m in path:
+        debugger.make(m)
+
+    # the worker's table outlives the task: report this task's share
+    table = debugger.table
+    before = table and [getattr(table, name) for name in TABLE_COUNTERS]
+    count = debugger.perft(depth)
+    probes = table and [getattr(table, name) - n
+                        for name, n in zip(TABLE_COUNTERS, before)]
+    return count, probes
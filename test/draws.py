@@ -0,0 +1,59 @@
+""" Repetition and fifty-move draws on known move sequences
+
+    $ pypy test/draws.py
+"""
+
+import sys
+
+from board import Board
+from search import uci
+
+
+SHUFFLE = "g8f6 g1f3 f6g8 f3g1"
+
+# (fen, moves, is_repetition(3) after each move)
+REPETITIONS = (
+    # the first occurrence follows a double push no pawn can capture
+    (None, "e2e4 " + SHUFFLE + " " + SHUFFLE,
+     [False] * 8 + [True]),
+    # ... and here one can: the right to capture lapses after one move,
+    # so the position after e4 differs from the one after each shuffle
+    ("rnbqkbnr/ppp1pppp/8/8/3p4/8/PPPPPPPP/RNBQKBNR w KQkq - 0 3",
+     "e2e4 " + SHUFFLE + " " + SHUFFLE + " " + SHUFFLE,
+     [False] * 9 + [True] * 4),
+)
+
+# (fen, is_fifty_move_draw)
+FIFTY_MOVES = (
+    ("8/8/8/4k3/8/8/4K3/8 w - - 99 80", False),
+    ("8/8/8/4k3/8/8/4K3/8 w - - 100 80", True),
+    # mate on the hundredth ply stands
+    ("7k/6Q1/6K1/8/8/8/8/8 b - - 100 80", False),
+)
+
+
+def play(board, text):
+    legal = dict((uci(m), m) for m in board.move_list())
+    board.make(legal[text])
+
+
+if __name__ == "__main__":
+    errors = 0
+
+    for fen, moves, expected in REPETITIONS:
+        board = fen and Board(fen) or Board()
+        got = []
+        for text in moves.split():
+            play(board, text)
+            got.append(board.is_repetition(3))
+        if got != expected:
+            print "%s %s: expected %r, got %r" % (fen, moves, expected, got)
+            errors += 1
+
+    for fen, expected in FIFTY_MOVES:
+        if Board(fen).is_fifty_move_draw() != expected:
+            print "%s: expected %r" % (fen, expected)
+            errors += 1
+
+    print errors and "FAILED: %i errors" % errors or "OK"
+    sys.exit(errors and 1 or 0)
@@ -0,0 +1,53 @@
+""" Fixed-depth searches: known mates are found, the board is restored,
+    and nodes per second are reported for the whole pipeline
+
+    $ pypy test/engine.py [depth]
+"""
+
+import sys
+import time
+
+from board import Board
+from transposition import SearchTable
+import search
+import suite
+
+
+# (fen, mating move, mate in n moves)
+MATES = (
+    ("r1bqkbnr/pppp1ppp/2n5/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 2 3", "h5f7", 1),
+    ("6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1", "a1a8", 1),
+    ("r2qkb1r/pp2nppp/3p4/2pNN1B1/2BnP3/3P4/PPP2PPP/R2bK2R w KQkq - 1 1", "d5f6", 2),
+    ("kbK5/pp6/1P6/8/8/8/8/R7 w - - 0 1", "a1a6", 2),
+)
+
+
+if __name__ == "__main__":
+    depth = len(sys.argv) > 1 and int(sys.argv[1]) or 4
+    errors = 0
+
+    for fen, best, n in MATES:
+        board = Board(fen)
+        result = search.Search(board).search(2 * n)
+        if search.uci(result.move) != best or \
+                result.score != search.MATE - (2 * n - 1):
+            print "missed mate in %i: %s (got %s, %i)" % (
+                n, fen, search.uci(result.move), result.score)
+            errors += 1
+
+    nodes, start = 0, time.time()
+    table = SearchTable()
+    for line, fen, results in list(suite.parse_perftsuite())[:20]:
+        board = Board(fen)
+        table.clear()
+        result = search.Search(board, table).search(depth)
+        nodes += result.nodes
+        if repr(board) != fen or not result.move:
+            print "%i: board not restored or no move" % line
+            errors += 1
+    elapsed = time.time() - start
+
+    print "depth %i: %i nodes in %.2fs (%i nps)" % (
+        depth, nodes, elapsed, nodes / elapsed)
+    print errors and "FAILED: %i errors" % errors or "OK"
+    sys.exit(errors and 1 or 0)
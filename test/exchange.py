@@ -0,0 +1,63 @@
+""" Static exchange evaluation on known exchanges, and `attackers_to`
+    checked against `is_attacked` on every square of the suite positions
+
+    $ pypy test/exchange.py
+"""
+
+import sys
+
+from board import Board, OFFSET
+from constants import *
+import search
+import suite
+
+
+# (fen, move, expected exchange)
+EXCHANGES = (
+    # undefended pawn
+    ("1k1r4/1pp4p/p7/4p3/8/P5P1/1PP4P/2K1R3 w - - 0 1", "e1e5", 100),
+    # both sides bring in X-ray attackers: N, n, R, b, Q (behind R), q
+    ("1k1r3q/1ppn3p/p4b2/4p3/8/P2N2P1/1PP1R1BP/2K1Q3 w - - 0 1", "d3e5", -220),
+    # the queen behind the bishop recaptures
+    ("4k3/8/2p5/3p4/8/8/6B1/4K2Q w - - 0 1", "g2d5", -130),
+    ("4k3/8/2p5/3p4/8/8/8/3QK3 w - - 0 1", "d1d5", -800),
+    ("4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 1", "e5d6", 100),
+    # the king recaptures, unless the square is defended
+    ("8/8/8/4pk2/8/3N4/8/5K2 w - - 0 1", "d3e5", -220),
+    ("8/8/8/4pk2/8/3N4/8/4RK2 w - - 0 1", "d3e5", 100),
+    # ... including by a slider behind the piece that just recaptured
+    ("6k1/4r3/5K2/4p3/8/3N4/8/8 w - - 0 1", "d3e5", 100),
+    ("4q1k1/4r3/5K2/4p3/8/3N4/8/8 w - - 0 1", "d3e5", -220),
+    # promotions
+    ("7k/3P4/8/8/8/8/8/K7 w - - 0 1", "d7d8q", 800),
+    ("r6k/3P4/8/8/8/8/8/1K6 w - - 0 1", "d7d8q", -100),
+    # a quiet move to an attacked square
+    ("4k3/8/8/2p5/8/1N6/8/4K3 w - - 0 1", "b3d4", -320),
+)
+
+
+if __name__ == "__main__":
+    errors = 0
+
+    for fen, uci, expected in EXCHANGES:
+        board = Board(fen)
+        moves = [m for m in board.move_list() if search.uci(m) == uci]
+        got = moves and board.see(moves[0])
+        if got != expected:
+            print "%s %s: expected %r, got %r" % (fen, uci, expected, got)
+            errors += 1
+
+    for line, fen, results in suite.parse_perftsuite():
+        board = Board(fen)
+        pos = board.positions
+        for sq in xrange(64):
+            attackers = board.attackers_to(sq)
+            for by in (WHITE, BLACK):
+                if (attackers & pos[OFFSET + by] != 0) != \
+                        board.is_attacked(sq, by, pos[-1]):
+                    print "%i: attackers_to(%i) disagrees for %i" % (
+                        line, sq, by)
+                    errors += 1
+
+    print errors and "FAILED: %i errors" % errors or "OK"
+    sys.exit(errors and 1 or 0)
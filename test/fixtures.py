@@ -0,0 +1,80 @@
+""" Positions and games shared by the test scripts
+
+    Every generator takes its own `random.Random`, seeded the same by
+    default, so each script sees the same boards from run to run.
+"""
+
+import random
+
+from board import Board
+import pgn
+import suite
+
+
+def random_moves(board, max_plies, rng):
+    """ Yield up to `max_plies` random legal moves on `board`, each
+        before it is made; it is made when the generator resumes
+    """
+    for ply in xrange(max_plies):
+        moves = board.move_list()
+        if not moves:
+            return
+        m = rng.choice(moves)
+        yield m
+        board.make(m)
+
+
+def positions(plies=4, rng=None, track_attacks=False):
+    """ Every suite position, and the position after each of `plies`
+        random moves from it
+    """
+    rng = rng or random.Random(0)
+    boards = []
+    for line, fen, results in suite.parse_perftsuite():
+        board = Board(fen, track_attacks)
+        boards.append(board.copy())
+        for m in random_moves(board, plies, rng):
+            after = board.copy()
+            after.make(m)
+            boards.append(after)
+    return boards
+
+
+def random_openings(n, plies=16, rng=None):
+    """ (games, [(position, move) for every move played]) of `n` random
+        openings
+    """
+    rng = rng or random.Random(0)
+    games, played = [], []
+    board = Board()
+    for i in xrange(n):
+        board.reset()
+        sans = []
+        for m in random_moves(board, plies, rng):
+            sans.append(pgn.to_san(board, m))
+            played.append((board.copy(), m))
+        games.append(pgn.Game({}, sans, rng.choice(("1-0", "0-1", "1/2-1/2"))))
+    return games, played
+
+
+def random_pgn(n, max_plies=120, rng=None):
+    """ (pgn text, [(fen, hash) after each ply]) of `n` random games """
+    rng = rng or random.Random(0)
+    text, expected = [], []
+    board = Board()
+    for i in xrange(n):
+        board.reset()
+        sans, plies = [], []
+        for m in random_moves(board, max_plies, rng):
+            if not board.player:
+                sans.append("%i." % board.full_moves)
+            sans.append(pgn.to_san(board, m))
+            board.make(m)
+            plies.append((repr(board), board.hash))
+            board.unmake()
+
+        text.append('[Event "random %i"]\n[Result "*"]\n' % i)
+        text.append("{ a comment\nover two lines } %s ( 1. e4 e5 ) *\n\n" % (
+            " ".join(sans)))
+        expected.append(plies)
+    return "\n".join(text), expected
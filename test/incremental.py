@@ -0,0 +1,38 @@
+""" Check the incremental evaluation sums against a full recomputation
+    after every move and take-back of random games from the suite
+    positions
+
+    $ pypy test/incremental.py [plies]
+"""
+
+import sys
+
+import evaluation
+import fixtures
+
+
+def check(board):
+    return (board.mg, board.eg, board.phase) == evaluation.compute(board)
+
+
+if __name__ == "__main__":
+    plies = len(sys.argv) > 1 and int(sys.argv[1]) or 40
+    errors = checked = 0
+
+    # each board carries the moves that led to it: check it after the
+    # last of them, then after taking that move back
+    for board in fixtures.positions(plies):
+        checked += 1
+        if not check(board):
+            print "mismatch after make: %r" % board
+            errors += 1
+        if board.moves:
+            board.unmake()
+            checked += 1
+            if not check(board):
+                print "mismatch after unmake: %r" % board
+                errors += 1
+
+    print "%i positions checked" % checked
+    print errors and "FAILED: %i mismatches" % errors or "OK"
+    sys.exit(errors and 1 or 0)
@@ -0,0 +1,48 @@
+""" Check that every bit twiddling kernel agrees, and time them
+
+    $ pypy test/kernels.py
+"""
+
+import random
+import sys
+
+import bitboards
+from bitboards import kernels
+
+
+def verify(name, rng=random.Random(0)):
+    """ Compare kernel `name` against "parallel" on random bitboards of
+        every density, and on every single-bit board
+    """
+    errors = 0
+    boards = [1 << sq for sq in xrange(64)] + [bitboards.FULL] + \
+        [rng.getrandbits(64) & rng.getrandbits(64) for i in xrange(2000)]
+    ref = kernels.KERNELS["parallel"]
+    for function, f in kernels.KERNELS[name].items():
+        for b in boards:
+            if f(b) != ref[function](b):
+                print "%s: %s mismatch bb=%#x" % (name, function, b)
+                errors += 1
+    return errors
+
+
+if __name__ == "__main__":
+    errors = sum(verify(name) for name in kernels.KERNELS if name != "parallel")
+
+    # an unmasked shift can leave bits above 63: the table popcount
+    # counts the low 64 bits instead of indexing past its table
+    wide = bitboards.FULL << 8
+    if kernels.popcount_table(wide) != 56:
+        print "table: popcount of %#x" % wide
+        errors += 1
+
+    results = kernels.benchmark()
+    functions = sorted(results["parallel"])
+    print "%-12s" % "" + "".join("%14s" % f for f in functions)
+    for name in sorted(results):
+        print "%-12s" % name + "".join(
+            "%12.2fms" % (results[name][f] * 1000) for f in functions)
+    print "fastest: %s (in use: %s)" % (kernels.fastest(), bitboards.KERNEL)
+
+    print errors and "FAILED: %i mismatches" % errors or "OK"
+    sys.exit(errors and 1 or 0)
@@ -0,0 +1,36 @@
+""" Memory used per Board
+
+    $ pypy test/memory.py [boards]
+"""
+
+import resource
+import sys
+
+from board import Board
+
+
+def deep_size(board):
+    """ Bytes held by `board` and its containers (cached small ints aside)
+        n.b. CPython only: PyPy does not support sys.getsizeof
+    """
+    size = sys.getsizeof(board)
+    for name in board.__slots__:
+        value = getattr(board, name)
+        size += sys.getsizeof(value)
+        if isinstance(value, list):
+            size += sum(sys.getsizeof(v) for v in value if not -5 <= v < 257)
+    return size
+
+
+def rss_per_board(n):
+    """ Growth in peak RSS per board when `n` boards are alive at once """
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    boards = [Board() for _ in xrange(n)]
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return (after - before) * 1024.0 / len(boards)  # ru_maxrss is in KB
+
+
+if __name__ == "__main__":
+    n = len(sys.argv) > 1 and int(sys.argv[1]) or 10000
+    print "getsizeof: %i bytes per board" % deep_size(Board())
+    print "peak RSS:  %.0f bytes per board (%i boards)" % (rss_per_board(n), n)
@@ -0,0 +1,50 @@
+""" Round trip positions through the binary format, and time it against FEN
+
+    $ pypy test/packing.py
+"""
+
+import sys
+import time
+
+from board import Board
+import fixtures
+import serialization
+
+
+def timed(f, *args):
+    start = time.time()
+    result = f(*args)
+    return result, time.time() - start
+
+
+if __name__ == "__main__":
+    boards = fixtures.positions()
+    errors = 0
+
+    for board in boards:
+        copy = Board.from_bytes(board.to_bytes())
+        if (repr(copy), copy.hash) != (repr(board), board.hash):
+            print "mismatch: %r != %r" % (copy, board)
+            errors += 1
+
+    buf, packing = timed(serialization.pack, boards)
+    view = memoryview(buf)
+    unpacked, _ = timed(lambda: [(repr(b), b.hash) for b in
+                                         serialization.unpack(view, Board())])
+    if unpacked != [(repr(b), b.hash) for b in boards]:
+        print "bulk unpack mismatch"
+        errors += 1
+
+    fens, writing = timed(lambda: [repr(b) for b in boards])
+    board = Board()
+    _, reading = timed(lambda: [board.reset(fen) for fen in fens])
+    _, loading = timed(lambda: [b for b in serialization.unpack(buf, board)])
+
+    n = len(boards)
+    print "%i positions: %i bytes packed, %i bytes of FEN" % (
+        n, len(buf), sum(len(f) for f in fens))
+    print "pack %.1fus, unpack %.1fus; FEN write %.1fus, read %.1fus" % (
+        packing / n * 1e6, loading / n * 1e6, writing / n * 1e6,
+        reading / n * 1e6)
+    print errors and "FAILED: %i mismatches" % errors or "OK"
+    sys.exit(errors and 1 or 0)
@@ -0,0 +1,37 @@
+""" Time perft with and without a transposition table, and check that
+    both count the same nodes
+
+    $ pypy test/perfttable.py [depth] [MB] [fen]
+"""
+
+import sys
+import time
+
+from board import Board
+from constants import *
+from debug import Debugger
+from transposition import PerftTable
+
+
+def timed_perft(fen, depth, table=None):
+    debugger = Debugger(Board(fen), quiet=True, table=table)
+    start = time.time()
+    nodes = debugger.perft(depth)
+    return nodes, time.time() - start
+
+
+if __name__ == "__main__":
+    depth = len(sys.argv) > 1 and int(sys.argv[1]) or 5
+    mb = len(sys.argv) > 2 and float(sys.argv[2]) or 64
+    fen = len(sys.argv) > 3 and sys.argv[3] or INITIAL_FEN
+
+    nodes, plain = timed_perft(fen, depth)
+    table = PerftTable(mb)
+    cached, elapsed = timed_perft(fen, depth, table)
+
+    print "perft(%i) %s" % (depth, fen)
+    print "without table: %i nodes in %.1fs" % (nodes, plain)
+    print "%gMB table:    %i nodes in %.1fs, %.1fx faster, %.0f%% hits" % (
+        mb, cached, elapsed, plain / elapsed, 100 * table.stats()["hit_rate"])
+    print nodes == cached and "OK" or "FAILED: counts differ"
+    sys.exit(nodes != cached and 1 or 0)
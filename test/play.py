@@ -0,0 +1,64 @@
+""" `Chess.play` makes exactly the legal moves: every legal move of the
+    suite positions and some random continuations is accepted, and every
+    other (from, to) pair is rejected with the board left untouched
+
+    $ pypy test/play.py [plies]
+"""
+
+import imp
+import os
+import sys
+
+from board import Board
+from search import uci
+from serialization import san
+import fixtures
+
+chessval = imp.load_source(
+    "chessval", os.path.join(os.path.dirname(__file__), "..", "__init__.py"))
+
+
+def check(fen):
+    """ Errors found trying every (from, to) pair on the position `fen` """
+    errors = []
+    legal = set(uci(m) for m in Board(fen).move_list())
+    chess = chessval.Chess(fen)
+    for frm in xrange(64):
+        for to in xrange(64):
+            text = san(frm) + san(to)
+            if text + "q" in legal or text + "n" in legal:
+                text += "q"
+            try:
+                chess.play(text)
+            except chessval.IllegalMove:
+                if text in legal:
+                    errors.append("%s rejected" % text)
+                if repr(chess.board) != fen:
+                    errors.append("%s changed the board" % text)
+                    chess.load(fen)
+            else:
+                if text not in legal:
+                    errors.append("%s accepted" % text)
+                chess.board.unmake()
+    return errors
+
+
+if __name__ == "__main__":
+    plies = len(sys.argv) > 1 and int(sys.argv[1]) or 2
+    errors = 0
+
+    # castling through pieces
+    try:
+        chessval.Chess().play("e1g1")
+        print "castled through the f1 bishop"
+        errors += 1
+    except chessval.IllegalMove:
+        pass
+
+    for board in fixtures.positions(plies):
+        for error in check(repr(board)):
+            print "%r: %s" % (board, error)
+            errors += 1
+
+    print errors and "FAILED: %i errors" % errors or "OK"
+    sys.exit(errors and 1 or 0)
@@ -0,0 +1,34 @@
+""" Round trip random games through SAN and PGN, and time the replay
+
+    $ pypy test/replay.py [games] [workers]
+"""
+
+import sys
+import time
+from StringIO import StringIO
+
+import fixtures
+import pgn
+
+
+if __name__ == "__main__":
+    n = len(sys.argv) > 1 and int(sys.argv[1]) or 50
+    workers = len(sys.argv) > 2 and int(sys.argv[2]) or 1
+
+    text, expected = fixtures.random_pgn(n)
+    errors = 0
+    plies = 0
+    start = time.time()
+    for index, records, error in pgn.replay(pgn.read_games(StringIO(text)),
+                                            workers):
+        plies += len(records)
+        got = [(r.fen, r.hash) for r in records]
+        if error or got != expected[index]:
+            print "game %i: %s" % (index, error or "positions differ")
+            errors += 1
+    elapsed = time.time() - start
+
+    print "%i games, %i plies in %.2fs (%.1f games/s, %i plies/s)" % (
+        n, plies, elapsed, n / elapsed, plies / elapsed)
+    print errors and "FAILED: %i games" % errors or "OK"
+    sys.exit(errors and 1 or 0)
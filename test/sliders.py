@@ -0,0 +1,36 @@
+""" Check that every slider backend agrees with the rotated lookups
+
+    $ pypy test/sliders.py
+"""
+
+import random
+import sys
+
+from bitboards import pieces
+from bitboards.magics import B_MASKS, R_MASKS, subsets
+from bitboards.masks import FULL
+
+
+def verify(name, rng=random.Random(0)):
+    """ Compare backend `name` against "rotated" for every square and every
+        relevant occupancy, with random noise on the irrelevant squares
+    """
+    errors = 0
+    R_ref, B_ref = pieces.SLIDERS["rotated"]
+    R_new, B_new = pieces.SLIDERS[name]
+    for ref, new, masks in ((R_ref, R_new, R_MASKS), (B_ref, B_new, B_MASKS)):
+        for sq in xrange(64):
+            for occ in subsets(masks[sq]):
+                noise = rng.getrandbits(64) & (FULL ^ masks[sq])
+                for o in (occ, occ | noise):
+                    if ref(o, sq) != new(o, sq):
+                        print "%s: %s mismatch sq=%i occ=%#x" % (
+                            name, ref.__name__, sq, o)
+                        errors += 1
+    return errors
+
+
+if __name__ == "__main__":
+    errors = sum(verify(name) for name in pieces.SLIDERS if name != "rotated")
+    print errors and "FAILED: %i mismatches" % errors or "OK"
+    sys.exit(errors and 1 or 0)
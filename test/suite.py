@@ -0,0 +1,120 @@
+import csv
+import json
+import multiprocessing
+import os
+import time
+
+from board import Board
+from debug import Debugger
+import bitboards as bb
+from transposition import PerftTable
+
+
+EPD = os.path.join(os.path.dirname(os.path.abspath(__file__)), "perftsuite.epd")
+FIELDS = ("line", "fen", "depth", "expected", "nodes", "seconds", "nps", "ok")
+
+
+def parse_perftsuite(path=EPD):
+    """ Yield (line number, fen, {depth: nodes}) for each suite position """
+    with open(path, 'rb') as csvfile:
+        reader = csv.reader(csvfile, delimiter=';')
+        for line, row in enumerate(reader, 1):
+            parsed = [c.strip() for c in row]
+            fen, results = parsed[0], [r.split() for r in parsed[1:]]
+            yield line, fen, {int(k[1:]): int(v) for k, v in results}
+
+
+def tasks(lines=None, depths=(1, 2, 3, 4, 5, 6), path=EPD):
+    """ (line, fen, depth, expected) for every selected position and depth,
+        largest first so long runs are started early in a pool
+    """
+    selected = []
+    for line, fen, results in parse_perftsuite(path):
+        if lines and line not in lines:
+            continue
+        for depth in depths:
+            if depth in results:
+                selected.append((line, fen, depth, results[depth]))
+    selected.sort(key=lambda t: -t[3])
+    return selected
+
+
+def run(selected, workers=1, table_mb=None, check_hash=False, reference=False,
+        sliders=None, kernel=None, track_attacks=False, callback=None):
+    """ Run perft for each task and return timed results, in suite order
+
+        :param callback: called with each result as it completes
+    """
+    initargs = (table_mb, check_hash, reference, sliders, kernel,
+                track_attacks)
+    if workers > 1:
+        pool = multiprocessing.Pool(workers, _init_worker, initargs)
+        completed = pool.imap_unordered(_run_task, selected)
+    else:
+        pool = None
+        _init_worker(*initargs)
+        completed = (_run_task(t) for t in selected)
+
+    results = []
+    try:
+        for result in completed:
+            results.append(result)
+            if callback:
+                callback(result)
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+    results.sort(key=lambda r: (r["line"], r["depth"]))
+    return results
+
+
+def write_json(results, path):
+    with open(path, 'wb') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def write_csv(results, path):
+    with open(path, 'wb') as f:
+        writer = csv.DictWriter(f, FIELDS)
+        writer.writeheader()
+        writer.writerows(results)
+
+
+### Process pool workers ###
+
+_worker = {}
+
+
+def _init_worker(table_mb=None, check_hash=False, reference=False,
+                 sliders=None, kernel=None, track_attacks=False):
+    if sliders:
+        bb.use_sliders(sliders)
+    if kernel:
+        bb.use_kernel(kernel)
+    table = table_mb and PerftTable(table_mb) or None
+    board = Board(track_attacks=track_attacks)
+    _worker["debugger"] = Debugger(board, quiet=True, table=table,
+                                   check_hash=check_hash, reference=reference)
+
+
+def _run_task(task):
+    line, fen, depth, expected = task
+    debugger = _worker["debugger"]
+    debugger.board.reset(fen)
+
+    start = time.time()
+    nodes = debugger.perft(depth)
+    seconds = time.time() - start
+
+    return {
+        "line": line,
+        "fen": fen,
+        "depth": depth,
+        "expected": expected,
+        "nodes": nodes,
+        "seconds": round(seconds, 6),
+        "nps": seconds and int(nodes / seconds) or 0,
+        "ok": nodes == expected,
+    }
@@ -0,0 +1,159 @@
+""" Bounded hash tables keyed by zobrist position keys: perft node
+    counts and search results
+"""
+
+
+DEPTH_PREFERRED = "depth"
+ALWAYS_REPLACE = "always"
+
+# Nominal cost of one entry on 64-bit CPython: three list slots plus the
+# boxed key and node count. Used to turn a memory budget into a size.
+ENTRY_SIZE = 88
+
+DEPTH_MIX = 0x9E3779B97F4A7C15L  # spreads (key, depth) pairs over buckets
+
+
+class PerftTable(object):
+    """ Node counts keyed by (position key, depth)
+
+        The table is split into 2^n buckets. With the depth-preferred
+        policy a bucket holds two slots: the first keeps the deepest
+        entry stored there, the second is always replaced. With the
+        always-replace policy a bucket is a single slot overwritten on
+        every store.
+
+        A probe that finds its bucket occupied by other positions only
+        is counted as a collision (as well as a miss).
+    """
+
+    def __init__(self, mb=16, policy=DEPTH_PREFERRED):
+        if policy not in (DEPTH_PREFERRED, ALWAYS_REPLACE):
+            raise ValueError("Unknown replacement policy: %r" % policy)
+
+        self.mb = mb
+        self.policy = policy
+        self.ways = policy == DEPTH_PREFERRED and 2 or 1
+
+        entries = max(int(mb * 1024 * 1024) / ENTRY_SIZE, self.ways)
+        buckets = 1 << ((entries / self.ways).bit_length() - 1)
+        self.mask = buckets - 1
+        self.size = buckets * self.ways
+        self.clear()
+
+    def clear(self):
+        self.keys = [None] * self.size
+        self.depths = [0] * self.size
+        self.nodes = [0] * self.size
+        self.hits = self.misses = self.collisions = self.stores = 0
+
+    def _bucket(self, key, depth):
+        return (((key ^ depth * DEPTH_MIX) & self.mask) * self.ways)
+
+    def probe(self, key, depth):
+        """ Return the stored node count, or None """
+        i = self._bucket(key, depth)
+        keys = self.keys
+        occupied = False
+        for j in xrange(i, i + self.ways):
+            if keys[j] == key and self.depths[j] == depth:
+                self.hits += 1
+                return self.nodes[j]
+            occupied = occupied or keys[j] is not None
+
+        self.misses += 1
+        if occupied:
+            self.collisions += 1
+        return None
+
+    def store(self, key, depth, nodes):
+        i = self._bucket(key, depth)
+        if self.ways == 2 and self.keys[i] is not None and \
+                self.depths[i] > depth:
+            i += 1  # keep the deeper entry, use the always-replace slot
+
+        self.keys[i] = key
+        self.depths[i] = depth
+        self.nodes[i] = nodes
+        self.stores += 1
+
+    def stats(self):
+        probes = self.hits + self.misses
+        return {
+            "size": self.size,
+            "policy": self.policy,
+            "probes": probes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "collisions": self.collisions,
+            "stores": self.stores,
+            "hit_rate": probes and float(self.hits) / probes or 0.0,
+        }
+
+
+EXACT = 0
+LOWER = 1  # score is a lower bound (the search failed high)
+UPPER = 2  # score is an upper bound (the search failed low)
+
+SEARCH_ENTRY_SIZE = 104  # five list slots plus the boxed key and score
+
+
+class SearchTable(object):
+    """ Search results keyed by position key: (depth, score, bound, move)
+
+        Two slots per bucket, as in `PerftTable`'s depth-preferred policy:
+        the first keeps the deepest result stored there, the second is
+        always replaced.
+    """
+
+    ways = 2
+
+    def __init__(self, mb=16):
+        self.mb = mb
+        entries = max(int(mb * 1024 * 1024) / SEARCH_ENTRY_SIZE, self.ways)
+        buckets = 1 << ((entries / self.ways).bit_length() - 1)
+        self.mask = buckets - 1
+        self.size = buckets * self.ways
+        self.clear()
+
+    def clear(self):
+        self.keys = [None] * self.size
+        self.depths = [0] * self.size
+        self.scores = [0] * self.size
+        self.bounds = [EXACT] * self.size
+        self.moves = [0] * self.size
+        self.hits = self.misses = self.stores = 0
+
+    def probe(self, key):
+        """ Return (depth, score, bound, move), or None """
+        i = (key & self.mask) * 2
+        keys = self.keys
+        if keys[i] != key:
+            i += 1
+            if keys[i] != key:
+                self.misses += 1
+                return None
+        self.hits += 1
+        return self.depths[i], self.scores[i], self.bounds[i], self.moves[i]
+
+    def store(self, key, depth, score, bound, move):
+        i = (key & self.mask) * 2
+        if self.keys[i] not in (None, key) and self.depths[i] > depth:
+            i += 1  # keep the deeper entry, use the always-replace slot
+
+        self.keys[i] = key
+        self.depths[i] = depth
+        self.scores[i] = score
+        self.bounds[i] = bound
+        self.moves[i] = move
+        self.stores += 1
+
+    def stats(self):
+        probes = self.hits + self.misses
+        return {
+            "size": self.size,
+            "probes": probes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "hit_rate": probes and float(self.hits) / probes or 0.0,
+        }
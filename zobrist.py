@@ -0,0 +1,49 @@
+""" Zobrist hashing
+
+    A position key is the XOR of a random 64-bit number for every
+    (piece, square) pair on the board, together with numbers for the
+    castling rights, the en passant file and the side to move. Making a
+    move only changes a handful of these terms, so the key can be
+    updated incrementally instead of being rebuilt from scratch.
+
+    The en passant file only counts while a pawn of the side to move
+    attacks the en passant square, as in Polyglot keys: otherwise a
+    double push would make the position differ from its repetitions.
+"""
+
+import random
+
+from constants import *
+import bitboards as bb
+
+
+_rng = random.Random(0x2C4E55)  # fixed seed: keys are stable between runs
+
+PIECE_SQ = [[_rng.getrandbits(64) for _ in xrange(64)] for _ in xrange(14)]
+CASTLING = [0L] + [_rng.getrandbits(64) for _ in xrange(15)]  # by rights
+EP = [_rng.getrandbits(64) for _ in xrange(8)]                # by file
+SIDE = _rng.getrandbits(64)                                     # black to move
+
+
+def ep_key(ep, player, positions):
+    """ The term for en passant square `ep` with `player` to move, or 0
+        if none of `player`'s pawns can capture there
+    """
+    if bb.P_ATTACKS[player^1][ep] & positions[WHITE_PAWN | player<<3]:
+        return EP[ep & 7]
+    return 0
+
+
+def compute(board):
+    """ Calculate the key for `board` from scratch """
+    key = 0L
+    for sq, piece in enumerate(board.occupancy):
+        if piece != -1:
+            key ^= PIECE_SQ[piece][sq]
+
+    key ^= CASTLING[board.castling]
+    if board.ep:
+        key ^= ep_key(board.ep, board.player, board.positions)
+    if board.player == BLACK:
+        key ^= SIDE
+    return key